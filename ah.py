@@ -25,87 +25,174 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import time
+
+# Taken before the other imports, which are the first phase of the startup
+STARTUP_START = time.perf_counter()
+
+import argparse
+import importlib
 import os
 import random
-import json
 import pygame as pg
 import ptext
 import sys
-
-from constants import SCREEN_WIDTH, SCREEN_HEIGHT, FPS, TITLE_SCREEN, GAME, GAME_OVER, GAME_COUNTDOWN, GAME_AREA, BLACK, \
-    AMBER, FONT_NAME, SONGS, GAME_OVER_SONG, HIGH_SCORES, HIGHSCORE_SCROLL_TOP_Y, HIGHSCORE_SCROLL_HEIGHT
-
-# Initialize Pygame
-pg.init()
-pg.display.set_icon(pg.image.load("gfx/window-icon.png"))
-screen = pg.display.set_mode(
-    (SCREEN_WIDTH, SCREEN_HEIGHT), pg.FULLSCREEN | pg.SCALED
-)
+import zlib
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, FPS, SIM_STEP, MAX_CATCHUP_STEPS, MAX_RENDER_FPS, TITLE_SCREEN, GAME, GAME_OVER, GAME_COUNTDOWN, GAME_AREA, BLACK, \
+    AMBER, FONT_NAME, SONGS, GAME_OVER_SONG, HIGH_SCORES, HIGH_SCORES_SHOWN, HIGH_SCORES_KEPT, HIGHSCORE_SCROLL_TOP_Y, HIGHSCORE_SCROLL_HEIGHT, \
+    HIGHSCORE_ROW_HEIGHT, SPRITE_CACHE_PRERENDER, SPAWN_AREA, BUBBLE_SPACING, PLAYER_CLEARANCE, MAX_SPAWN_ATTEMPTS
+from sprites import RotozoomCache
+from assets import AssetManager
+from highscores import HighScores
+from music import Playlist
+from sound import SoundManager
+from spatial import OccupancyGrid, find_free_position
+from render import DirtyRenderer
+from profiler import FrameProfiler, PHASES
+from scroller import Scroller
 
 ptext.DEFAULT_FONT_NAME = FONT_NAME
 
-SOUNDS = {
-    "pick": pg.mixer.Sound("sfx/pick.ogg"),
-    "bubble": pg.mixer.Sound("sfx/bubble.ogg"),
-    "end": pg.mixer.Sound("sfx/end.ogg"),
-    "player": pg.mixer.Sound("sfx/player.ogg"),
-}
-
-END_MUSIC = pg.USEREVENT + 2
-
-BUBBLE_IMAGE = pg.image.load("gfx/normal_ball.png").convert_alpha()
-BUBBLE_IMAGE.set_colorkey(BLACK)
-SPECIAL_IMAGE = pg.image.load("gfx/special.png").convert_alpha()
-SPECIAL_IMAGE.set_colorkey(BLACK)
-
-
-def vec_to_int(vector):
-    return tuple(map(int, vector))
-
+# Duration of each phase of the startup in seconds, in order
+STARTUP_PHASES = []
 
-class Bubble:
-    def __init__(self, pos, lifetime):
-        self.lifetime = lifetime
-        self.liferemaining = lifetime
-        self.image = BUBBLE_IMAGE
-        self.rect = self.image.get_rect(center=pos)
-        self.scaled_rect = self.rect.copy()
-        self.angle = random.uniform(0, 360)
-        self.rotation = random.uniform(-2.0, 2.0)
 
-    def update(self, delta_time):
-        self.angle += self.rotation
-        self.liferemaining -= delta_time
-        if self.liferemaining <= 0:
-            return False
-        return True
+# End the current phase of the startup, which began where the previous one
+# ended
+def startup_phase(name):
+    start = STARTUP_START + sum(seconds for _, seconds in STARTUP_PHASES)
+    STARTUP_PHASES.append((name, time.perf_counter() - start))
 
-    def draw(self, surface):
-        scale = self.liferemaining / self.lifetime
-        img = pg.transform.rotozoom(self.image, self.angle, scale)
-        self.scaled_rect = img.get_rect(center=self.rect.center)
-        surface.blit(img, self.scaled_rect)
 
-    def play_sound(self):
-        SOUNDS["pick"].play()
+startup_phase("imports")
 
-    def do_action(self, context):
-        context.score += max(int(self.liferemaining / self.lifetime * 20), 1)
-
-    def check_collision(self, rect):
-        return self.scaled_rect.colliderect(rect)
+END_MUSIC = pg.USEREVENT + 2
 
+STATE_NAMES = {TITLE_SCREEN: "title", GAME_COUNTDOWN: "countdown", GAME: "game", GAME_OVER: "game over"}
+# Where F4 saves the frame trace unless --profile names a file
+TRACE_FILE = "ah-trace.json"
+
+
+# Bubble frames are rendered from the bubble image on demand, unless
+# SPRITE_CACHE_PRERENDER is set
+def sprite_frames(image):
+    frames = RotozoomCache(ASSETS.get(image))
+    if SPRITE_CACHE_PRERENDER:
+        frames.prerender()
+    return frames
+
+
+# Assets are loaded on first use. Each game state has a group of the assets it
+# needs, which is loaded in the background during the state before it.
+ASSETS = AssetManager()
+ASSETS.add("icon", lambda: pg.image.load("gfx/window-icon.png"))
+ASSETS.image("bubble_image", "gfx/normal_ball.png", colorkey=BLACK)
+ASSETS.image("special_image", "gfx/special.png", colorkey=BLACK)
+ASSETS.add("bubble_frames", lambda: sprite_frames("bubble_image"))
+ASSETS.add("special_frames", lambda: sprite_frames("special_image"))
+WORM_IMAGES = tuple(f"worm_{size}" for size in (100, 80, 64, 51, 40))
+for size in (100, 80, 64, 51, 40):
+    ASSETS.image(f"worm_{size}", f"gfx/slimeball_{size}.png")
+for sound in ("pick", "bubble", "end", "player"):
+    ASSETS.sound(f"{sound}_sound", f"sfx/{sound}.ogg")
+
+# The bubble field needs NumPy, which takes longer to import than all of the
+# rest of the startup, so it is imported in the background like an asset.
+# PyInstaller can't see an import by name, so build.cmd lists it as hidden.
+ASSETS.add("bubblefield", lambda: importlib.import_module("bubblefield"))
+
+GAME_ASSETS = (
+    "bubblefield", "bubble_image", "special_image", "bubble_frames", "special_frames", *WORM_IMAGES,
+    "pick_sound", "bubble_sound", "player_sound",
+)
+ASSETS.group(TITLE_SCREEN, ())
+ASSETS.group(GAME_COUNTDOWN, GAME_ASSETS)
+ASSETS.group(GAME, GAME_ASSETS)
+ASSETS.group(GAME_OVER, ("end_sound",))
+# Every round needs the game assets again, and the sprite frames are rendered
+# as the bubbles first show up, so the game assets stay loaded after the first
+# round. Only the game over jingle is unloaded in between.
+ASSETS.keep(GAME_ASSETS)
+
+# Each category of sound has channels of its own. Bubbles can be picked and
+# spawned many times a frame in stress mode, but only one of each is heard.
+def configure_sounds(sounds):
+    sounds.category("pick", channels=4)
+    sounds.category("spawn", channels=2)
+    sounds.category("movement", channels=1)
+    sounds.category("jingle", channels=1)
+    sounds.sound("pick", "pick_sound", "pick", priority=1)
+    sounds.sound("bubble", "bubble_sound", "spawn", priority=0)
+    sounds.sound("player", "player_sound", "movement")
+    sounds.sound("end", "end_sound", "jingle", priority=2)
+
+
+SOUNDS = SoundManager(ASSETS.get)
+configure_sounds(SOUNDS)
+
+
+# Per-user directory for the rendered text kept between runs
+def text_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+    elif sys.platform == "darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "AH Game", "text")
+
+
+# Per-user file for the high scores
+def highscore_file():
+    if sys.platform == "win32":
+        base = os.path.join(os.path.expanduser("~"), "Saved Games")
+    elif sys.platform == "darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, "AH Game", "highscore.json")
+
+
+# Where the high scores were kept before, on every platform
+def old_highscore_file():
+    return os.path.join(os.path.expanduser("~"), "Saved Games", "AH Game", "highscore.json")
+
+
+# Initialize the parts of Pygame used by the game and open the display. The
+# mixer is initialized when audio is first used. In headless mode the SDL
+# dummy drivers are used and nothing is shown or heard, and rendered text is
+# not kept on disk.
+def init(headless=False):
+    if headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    else:
+        # The big static strings are only rendered on the first launch
+        ptext.DISK_CACHE_DIR = text_cache_dir()
+    pg.display.init()
+    if headless:
+        screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    else:
+        pg.display.set_icon(ASSETS.get("icon"))
+        try:
+            screen = pg.display.set_mode(
+                (SCREEN_WIDTH, SCREEN_HEIGHT), pg.FULLSCREEN | pg.SCALED, vsync=1
+            )
+        except pg.error:
+            # No vsync available, MAX_RENDER_FPS limits the frame rate
+            screen = pg.display.set_mode(
+                (SCREEN_WIDTH, SCREEN_HEIGHT), pg.FULLSCREEN | pg.SCALED
+            )
+    startup_phase("display")
+    pg.font.init()
+    startup_phase("fonts")
 
-class Powerup(Bubble):
-    def __init__(self, pos, lifetime):
-        super().__init__(pos, lifetime)
-        self.image = SPECIAL_IMAGE
+    return screen
 
-    def play_sound(self):
-        SOUNDS["pick"].play()
 
-    def do_action(self, context):
-        context.time_remaining += random.randint(5, 15) * 1000
+def vec_to_int(vector):
+    return tuple(map(int, vector))
 
 
 class Player:
@@ -113,20 +200,12 @@ class Player:
     MAX_DIST = 20
 
     def __init__(self):
-        self.images = [
-            pg.image.load("gfx/slimeball_100.png").convert_alpha(),
-            pg.image.load("gfx/slimeball_80.png").convert_alpha(),
-            pg.image.load("gfx/slimeball_64.png").convert_alpha(),
-            pg.image.load("gfx/slimeball_51.png").convert_alpha(),
-            pg.image.load("gfx/slimeball_40.png").convert_alpha(),
-        ]
+        self.images = [ASSETS.get(name) for name in WORM_IMAGES]
         self.pos = [pg.Vector2() for _ in range(5)]
+        self.prev_pos = [pg.Vector2() for _ in range(5)]
         self.vec = pg.Vector2()
         self.vec_dt = pg.Vector2()
-
-    @property
-    def rect(self):
-        return self.images[0].get_rect(center=(vec_to_int(self.pos[0])))
+        self.rect = self.images[0].get_rect()
 
     def set_pos(self, x, y):
         self.pos[0].xy = (x, y)
@@ -134,13 +213,18 @@ class Player:
         self.pos[2].xy = (x + 28, y)
         self.pos[3].xy = (x + 38, y)
         self.pos[4].xy = (x + 48, y)
+        for prev, vec in zip(self.prev_pos, self.pos):
+            prev.update(vec)
+        self.rect.center = vec_to_int(self.pos[0])
 
     def update(self, target_vec, speed):
+        for prev, vec in zip(self.prev_pos, self.pos):
+            prev.update(vec)
         self.pos[0] += target_vec * speed
         rect = self.images[0].get_rect(center=vec_to_int(self.pos[0]))
 
         if rect.left < GAME_AREA.left + 2:
-            targt_vec.x = -target_vec.x
+            target_vec.x = -target_vec.x
             self.pos[0] += target_vec * speed
             rect.centerx = int(self.vec.x)
         if rect.right > GAME_AREA.right - 2:
@@ -171,13 +255,17 @@ class Player:
                 src += dst2 - dst
 
             self.pos[i] = src
+        # Bounds of the head, computed once per tick for collision checks
+        self.rect.center = vec_to_int(self.pos[0])
         return target_vec
 
-    def draw(self, surface):
+    # alpha is the fraction of a simulation step passed since the last update,
+    # the worm is drawn between its previous and current positions.
+    def draw(self, renderer, alpha=1.0):
         rect = self.images[0].get_rect()
-        for image, vec in zip(reversed(self.images), reversed(self.pos)):
-            rect.center = vec_to_int(vec)
-            surface.blit(image, rect)
+        for i in range(len(self.images) - 1, -1, -1):
+            rect.center = vec_to_int(self.prev_pos[i].lerp(self.pos[i], alpha))
+            renderer.blit(("worm", i), self.images[i], rect.topleft)
 
 
 class Context:
@@ -187,21 +275,49 @@ class Context:
             setattr(self, k, v)
 
 
+# Clock for simulations, every tick takes exactly one simulation step of game
+# time no matter how long the frame really took.
+class SyntheticClock:
+    def __init__(self):
+        self.time = 0
+
+    def tick(self, framerate=0):
+        self.time += SIM_STEP
+        return SIM_STEP
+
+    def get_time(self):
+        return self.time
+
+
 class Game:
-    def __init__(self, screen):
+    # rng, clock and the event source can be replaced for simulations. With
+    # music=False no music is played and with persist=False high scores are
+    # not read from or written to disk. With profile set to a file name every
+    # frame is profiled and the trace is saved to the file on quit.
+    def __init__(self, screen, stress=0, rng=None, clock=None, get_events=pg.event.get, music=True, persist=True,
+                 profile=None):
         self.screen = screen
-        self.clock = pg.time.Clock()
-
-        self.songs = list(SONGS[:])
-        random.shuffle(self.songs)
-        self.song_index = 0
-        pg.mixer.music.set_endevent(END_MUSIC)
-        pg.mixer.music.load(self.songs[self.song_index])
-        pg.mixer.music.play()
+        self.stress = stress
+        self.rng = rng or random.Random()
+        self.clock = clock or pg.time.Clock()
+        self.get_events = get_events
+        self.music = music
+        self.persist = persist
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.renderer = DirtyRenderer(screen, BLACK)
+        self.show_stats = False
+        self.show_profile = False
+        self.profile = profile
+        self.profiler = FrameProfiler()
+        self.profiler.enabled = profile is not None
+        self.profile_time = 0.0
+        self.trace_file = profile or TRACE_FILE
+        self.create_texts()
+
+        self.playlist = Playlist(SONGS, self.rng, END_MUSIC)
         pg.display.set_caption("ÄH!")
 
-        self.player = Player()
-
         self.game_state = {
             TITLE_SCREEN: (self.title_event, self.title_update, self.title_draw,),
             GAME_COUNTDOWN: (
@@ -213,33 +329,150 @@ class Game:
             GAME_OVER: (self.gameover_event, self.gameover_update, self.gameover_draw,),
         }
 
-        self.high_scores = HIGH_SCORES
-        self.load_highscores()
+        # Read in the background, they are first needed when the game ends
+        self.high_scores = HighScores(
+            HIGH_SCORES, highscore_file() if persist else None, HIGH_SCORES_KEPT, old_highscore_file()
+        )
+        self.high_scores.load()
+        self.highscore_scroller = Scroller(
+            HIGHSCORE_SCROLL_HEIGHT, HIGHSCORE_ROW_HEIGHT, self.high_scores.page, self.render_highscore
+        )
+        self.out_fader = None
 
         self.state = None
         self.context = self.title_start(None)
+        startup_phase("assets")
+
+    # Switch to the assets of the new state and load the ones of the state
+    # after it in the background
+    def enter_state(self, state, next_state):
+        ASSETS.acquire(state)
+        if self.state is not None:
+            ASSETS.release(self.state)
+        self.state = state
+        ASSETS.preload(next_state)
+
+    # Text shown on the screens. The texts are only rendered again when they change.
+    def create_texts(self):
+        self.title_text = ptext.Text("ÄH!", midtop=(SCREEN_WIDTH // 2, 20), color=AMBER, fontsize=150, surf=None)
+        self.begin_text = ptext.Text(
+            "CLICK MOUSE BUTTON\nTO BEGIN",
+            center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2),
+            color=AMBER,
+            fontsize=40,
+            surf=None,
+        )
+        self.instructions_text = ptext.Text(
+            "You are the green worm trying to catch the appearing\n"
+            + "bubbles by clicking towards them with your mouse.\n"
+            + "The faster you click, the faster your worm moves.\n"
+            + "Be quick, you have only 30 seconds.\n\n"
+            + "Press ESC to quit.",
+            midbottom=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 5),
+            color=AMBER,
+            fontsize=18,
+            align="left",
+            surf=None,
+        )
+        # Counters change all the time, so they are composed from cached glyphs
+        self.count_text = ptext.Text(
+            "", center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2), color=AMBER, fontsize=40, surf=None, glyphs=True
+        )
+        self.score_text = ptext.Text("", topleft=(5, 5), color=AMBER, fontsize=18, surf=None, glyphs=True)
+        self.time_text = ptext.Text("", topleft=(500, 5), fontsize=18, color=AMBER, surf=None, glyphs=True)
+        self.gameover_text = ptext.Text("GAME OVER", center=(SCREEN_WIDTH // 2, 60), color=AMBER, fontsize=60, surf=None)
+        self.final_score_text = ptext.Text("", midtop=(SCREEN_WIDTH // 2, 150), fontsize=18, color=AMBER, surf=None)
+        self.enter_name_text = ptext.Text(
+            "YOU MADE HIGH SCORE!\nENTER YOUR NAME BELOW:", midtop=(SCREEN_WIDTH // 2, 100), fontsize=18, color=AMBER,
+            surf=None,
+        )
+        self.name_text = ptext.Text("", topleft=(0, 0), fontsize=18, color=AMBER, surf=None, glyphs=True)
+        self.restart_text = ptext.Text(
+            "PRESS MOUSE BUTTON TO RESTART", midbottom=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 5), fontsize=18, color=AMBER,
+            surf=None,
+        )
+        self.debug_text = ptext.Text(
+            "", bottomright=(SCREEN_WIDTH - 5, SCREEN_HEIGHT - 5), fontsize=14, color=(255, 0, 255), surf=None,
+            glyphs=True,
+        )
+        self.stats_text = ptext.Text(
+            "", bottomleft=(5, SCREEN_HEIGHT - 5), fontsize=12, color=(255, 0, 255), surf=None, glyphs=True,
+        )
+        self.profile_text = ptext.Text(
+            "", topright=(SCREEN_WIDTH - 5, 30), fontsize=12, color=(255, 0, 255), surf=None, glyphs=True,
+            align="right",
+        )
 
-    def load_highscores(self):
-        highscore_file = os.path.join(os.path.expanduser('~'), 'Saved Games', 'AH Game', "highscore.json")
-        if not os.path.isfile(highscore_file):
-            self.save_highscores()
-        with open(highscore_file, "rt") as f:
-            self.high_scores = json.loads(f.read())
-
-
-    def save_highscores(self):
-        save_path = os.path.join(os.path.expanduser('~'), 'Saved Games', 'AH Game')
-        save_file = os.path.join(save_path, "highscore.json")
-        os.makedirs(save_path, exist_ok=True)
-        with open(save_file, "wt+") as f:
-            f.write(json.dumps(self.high_scores, indent=4))
+    # Text cache statistics, one line per cache and one for the time spent in rendering and wrapping,
+    # then the sound and music statistics
+    def stats_lines(self):
+        stats = ptext.getstats()
+        lines = []
+        for name, cache in stats.items():
+            if not isinstance(cache, dict):
+                continue
+            size = f"  {cache['bytes'] / (1 << 20):.2f} MB" if cache["bytes"] is not None else ""
+            lines.append(
+                f"{name}: {cache['hits']} hits  {cache['misses']} misses  {cache['evictions']} evictions  "
+                + f"{cache['entries']} entries{size}"
+            )
+        lines.append(
+            f"render {stats['render_count']} / {stats['render_time'] * 1000:.1f} ms  "
+            + f"wrap {stats['wrap_count']} / {stats['wrap_time'] * 1000:.1f} ms"
+        )
+        sounds = SOUNDS.stats()
+        lines.append(
+            f"sound {sounds['plays']} plays  {sounds['capped']} capped  {sounds['stolen']} stolen  "
+            + f"{sounds['dropped']} dropped  {sounds['volume_changes']} volume changes"
+        )
+        if self.music:
+            changes = "  ".join(f"{ms:.0f}" for ms in self.playlist.track_changes)
+            lines.append(f"music track changes, worst frame ms: {changes}")
+        return lines
+
+    # Frame time percentiles of the current state, refreshed twice a second so
+    # that the overlay stays readable
+    def update_profile_text(self):
+        now = time.perf_counter()
+        if now - self.profile_time < 0.5:
+            return
+        self.profile_time = now
+        state = STATE_NAMES[self.state]
+        stats = self.profiler.stats().get(state, {})
+        lines = [f"{state}  p50 / p95 / p99 / max ms"]
+        for phase in PHASES + ("frame",):
+            if phase in stats:
+                lines.append(f"{phase}  " + " / ".join(f"{ms:.2f}" for ms in stats[phase]))
+        self.profile_text.text = "\n".join(lines)
+
+    # The text of the next screens is rendered in the background while the
+    # current one is showing, so that their first frames don't hitch
+    def prewarm_countdown(self):
+        ptext.prewarmasync([
+            ("0123456789GO!", self.count_text),
+            ("SCORE: 0123456789", self.score_text),
+            ("TIME LEFT: 0123456789", self.time_text),
+        ])
+
+    def prewarm_gameover(self):
+        ptext.prewarmasync([
+            self.gameover_text,
+            self.enter_name_text,
+            self.restart_text,
+            ("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789\u258E", self.name_text),
+            *(
+                (self.highscore_text(entry), dict(fontsize=18, color=AMBER))
+                for entry in self.high_scores.top(HIGH_SCORES_SHOWN)
+            ),
+        ])
 
     # Title screen
     def title_start(self, old_context):
-        self.state = TITLE_SCREEN
+        self.enter_state(TITLE_SCREEN, GAME_COUNTDOWN)
         context = Context()
         context.done = False
-        context.name, context.name_pos = ptext.draw("ÄH!", midtop=(SCREEN_WIDTH // 2, 20), color=AMBER, fontsize=150, surf=None)
+        ptext.prewarm([self.title_text, self.begin_text, self.instructions_text])
+        self.prewarm_countdown()
         return context
 
     def title_event(self, context, event):
@@ -252,70 +485,73 @@ class Game:
             return self.countdown_start
         return None
 
-    def title_draw(self, context, surface):
-        surface.blit(context.name, context.name_pos)
-        ptext.draw(
-            "CLICK MOUSE BUTTON\nTO BEGIN",
-            center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2),
-            color=AMBER,
-            fontsize=40,
-        )
-        ptext.draw(
-            "You are the green worm trying to catch the appearing\n"
-            + "bubbles by clicking towards them with your mouse.\n"
-            + "The faster you click, the faster your worm moves.\n"
-            + "Be quick, you have only 30 seconds.\n\n"
-            + "Press ESC to quit.",
-            midbottom=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 5),
-            color=AMBER,
-            fontsize=18,
-            align="left",
-        )
+    def title_draw(self, context, renderer):
+        renderer.blit("title", *self.title_text.draw())
+        renderer.blit("begin", *self.begin_text.draw())
+        renderer.blit("instructions", *self.instructions_text.draw())
 
     # Countdown screen
     def countdown_start(self, old_context):
-        self.state = GAME_COUNTDOWN
+        self.enter_state(GAME_COUNTDOWN, GAME)
         context = Context()
         context.count = 4000
+        context.text = self.countdown_text(context.count)
+        context.prewarmed = False
         return context
 
+    def countdown_text(self, count):
+        count = int(count // 1000)
+        return f"{count}" if count else "GO!"
+
     def countdown_event(self, context, event):
         pass
 
     def countdown_update(self, context, delta_time):
         context.count -= delta_time
-        count = context.count // 1000
-        context.text = f"{count}" if count else "GO!"
+        context.text = self.countdown_text(context.count)
+        # Halfway through the first digit, when no text of the countdown is
+        # rendered that would have to wait for the worker
+        if not context.prewarmed and context.count < 3500:
+            context.prewarmed = True
+            self.prewarm_gameover()
         if context.count < 0:
             return self.game_start
 
-    def countdown_draw(self, context, surface):
-        ptext.draw(
-            context.text,
-            center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2),
-            color=AMBER,
-            fontsize=40,
-        )
+    def countdown_draw(self, context, renderer):
+        self.count_text.text = context.text
+        renderer.blit("count", *self.count_text.draw())
 
     # Game screen
     def game_start(self, old_context):
-        self.state = GAME
+        self.enter_state(GAME, GAME_OVER)
         context = Context()
-        context.player = self.player
-        initial_pos = (random.randint(90, 550), random.randint(70, 410))
+        context.player = Player()
+        initial_pos = (self.rng.randint(90, 550), self.rng.randint(70, 410))
         context.src_vec = pg.Vector2(initial_pos)
         context.player.set_pos(*initial_pos)
         context.score = 0
-        context.bubbles = []
-        context.next_bubble = random.randint(1500, 5000)
+        context.spawn_grid = OccupancyGrid(SPAWN_AREA, BUBBLE_SPACING)
+        frames = ASSETS.get("bubble_frames"), ASSETS.get("special_frames")
+        context.bubbles = ASSETS.get("bubblefield").BubbleField(frames, GAME_AREA, grid=context.spawn_grid)
+        context.next_bubble = self.rng.randint(1500, 5000)
         context.time_remaining = 30000
         context.speed_factor = 0.98
         context.tgt_vec = pg.Vector2()
         context.speed = 0.0
-        context.old_speed = 0.0
         context.dst_vec = pg.Vector2()
         return context
 
+    def spawn_stress_bubbles(self, bubbles, count):
+        bubblefield = ASSETS.get("bubblefield")
+        bubbles.spawn_many(
+            [self.rng.randint(50, 590) for _ in range(count)],
+            [self.rng.randint(50, 430) for _ in range(count)],
+            [self.rng.randint(1000, 7000) for _ in range(count)],
+            [bubblefield.POWERUP if self.rng.randint(0, 10) == 0 else bubblefield.BUBBLE for _ in range(count)],
+            [self.rng.uniform(0, 360) for _ in range(count)],
+            [self.rng.uniform(-2.0, 2.0) for _ in range(count)],
+        )
+
     def game_event(self, context, event):
         if event.type == pg.MOUSEBUTTONDOWN:
             # Move player towards clicked place
@@ -328,34 +564,30 @@ class Game:
                 context.speed += 0.8
 
     def game_update(self, context, delta_time):
+        bubblefield = ASSETS.get("bubblefield")
         context.next_bubble -= delta_time
-        if context.next_bubble <= 0:
-            context.next_bubble = random.randint(500, 2000)
+        if self.stress:
+            # Stress mode keeps the field filled up without caring about overlap
+            missing = self.stress - len(context.bubbles)
+            if missing > 0:
+                self.spawn_stress_bubbles(context.bubbles, missing)
+        elif context.next_bubble <= 0:
+            context.next_bubble = self.rng.randint(500, 2000)
             # Spawn a new bubble
             # Make sure that new bubble doesn't overlap existing
-            # bubbles and is not near vicinity of the player
-            bubble_class = Bubble
-            if random.randint(0, 10) == 0:
-                bubble_class = Powerup
-            accepted = False
-            x, y = 0, 0
-            while not accepted:
-                accepted = True
-                x = random.randint(50, 590)
-                y = random.randint(50, 430)
-                new_vec = pg.Vector2((x, y))
-                # Check distance other bubbles
-                for bubble in context.bubbles:
-                    bubble_vec = pg.Vector2(bubble.rect.center)
-                    if new_vec.distance_squared_to(bubble_vec) < 1600:
-                        # Bubble too close to another bubble
-                        accepted = False
-                        break
-                if new_vec.distance_squared_to(context.player.vec) < 3600:
-                    accepted = False
-            new_bubble = bubble_class((x, y), random.randint(1000, 7000))
-            context.bubbles.append(new_bubble)
-            SOUNDS["bubble"].play()
+            # bubbles and is not near vicinity of the player.
+            # If no free place is found the bubble is skipped.
+            kind = bubblefield.BUBBLE
+            if self.rng.randint(0, 10) == 0:
+                kind = bubblefield.POWERUP
+            pos = find_free_position(
+                self.rng, context.spawn_grid, context.player.pos[0], PLAYER_CLEARANCE, MAX_SPAWN_ATTEMPTS
+            )
+            if pos is not None:
+                context.spawn_grid.add(*pos)
+                context.bubbles.spawn(pos, self.rng.randint(1000, 7000), kind,
+                                      self.rng.uniform(0, 360), self.rng.uniform(-2.0, 2.0))
+                SOUNDS.play("bubble")
 
         context.src_vec += context.tgt_vec * context.speed
         context.tgt_vec = context.player.update(context.tgt_vec, context.speed)
@@ -368,69 +600,58 @@ class Game:
             if context.speed < 0.06:
                 context.speed = 0
 
-        for bubble in context.bubbles[:]:
-            if bubble.check_collision(context.player.rect):
-                # Player hit the bubble
-                bubble.play_sound()
-                bubble.do_action(context)
-                context.bubbles.remove(bubble)
-                continue
-            if not bubble.update(delta_time):
-                # Bubble died
-                context.bubbles.remove(bubble)
-                continue
+        kinds, fractions = context.bubbles.collide(context.player.rect)
+        if len(kinds):
+            # Player hit bubbles
+            SOUNDS.play("pick")
+            context.score += bubblefield.bubble_score(kinds, fractions)
+            # A stress mode field is full of powerups, which would make the
+            # round go on forever, so there they don't add time
+            if not self.stress:
+                for _ in range(int((kinds == bubblefield.POWERUP).sum())):
+                    context.time_remaining += self.rng.randint(5, 15) * 1000
+        context.bubbles.update(delta_time)
 
         # Player movement sound
         if context.speed > 0:
-            if context.old_speed == 0:
-                # Movement started
-                SOUNDS["player"].play(-1)
-            SOUNDS["player"].set_volume(context.speed / 5.0)
+            SOUNDS.loop("player", context.speed / 5.0)
         else:
             # Movement stopped
-            SOUNDS["player"].stop()
+            SOUNDS.stop("player")
 
         context.time_remaining -= delta_time
         if context.time_remaining <= 0:
-            SOUNDS["player"].stop()
+            SOUNDS.stop("player")
             return self.gameover_start
 
-        context.old_speed = context.speed
+    def game_draw(self, context, renderer):
+        renderer.rect("border", AMBER, GAME_AREA, width=2)
+        context.bubbles.draw(renderer, self.alpha)
 
-    def game_draw(self, context, surface):
-        pg.draw.rect(surface, AMBER, GAME_AREA, width=2)
-        for bubble in context.bubbles:
-            bubble.draw(surface)
-
-        ptext.draw(
-            f"SCORE: {context.score:05}", topleft=(5, 5), color=AMBER, fontsize=18,
-        )
-        ptext.draw(
-            f"TIME LEFT: {context.time_remaining // 1000}",
-            topleft=(500, 5),
-            fontsize=18,
-            color=AMBER,
-        )
-        context.player.draw(surface)
-        #surface.blit(context.player, context.player_rect)
+        self.score_text.text = f"SCORE: {context.score:05}"
+        renderer.blit("score", *self.score_text.draw())
+        self.time_text.text = f"TIME LEFT: {int(context.time_remaining // 1000)}"
+        renderer.blit("time", *self.time_text.draw())
+        context.player.draw(renderer, self.alpha)
 
         # Speedmeter
         spd = int(630 * context.speed / 5.0)
         speed_meter = pg.Rect((5, 445), (spd, 20))
-        surface.fill(AMBER, speed_meter)
+        renderer.fill("speed", AMBER, speed_meter)
 
     # Game over screen
     def gameover_start(self, old_context):
-        self.state = GAME_OVER
+        self.enter_state(GAME_OVER, TITLE_SCREEN)
         context = Context()
         context.count = 60000
         context.score = old_context.score
         context.end_jingle_start = context.count - 250
-        context.end_jingle_stop = 60000 - SOUNDS["end"].get_length() * 1000
+        context.end_jingle_stop = 60000 - ASSETS.get("end_sound").get_length() * 1000
         context.played_fanfare = False
-        pg.mixer.music.set_endevent()
-        pg.mixer.music.fadeout(250)
-        context.is_high_score = context.score >= self.high_scores[-1][0]
+        if self.music:
+            self.playlist.fadeout(250, resume=False)
+            self.playlist.preload(GAME_OVER_SONG)
+        context.is_high_score = self.high_scores.qualifies(context.score, HIGH_SCORES_SHOWN)
         context.high_score_name = ""
 
         if not context.is_high_score:
@@ -438,40 +659,33 @@ class Game:
 
         return context
 
-    def gameover_highscores(self, context):
-        txt = ""
-        for score, name in self.high_scores:
-            txt += f"{score:04}  {name}\n"
-        tmp_img, _ = ptext.draw(
-            txt, topleft=(0, 0), fontsize=18, color=AMBER, surf=None
-        )
+    def highscore_text(self, entry):
+        score, name = entry
+        return f"{score:04}  {name}"
 
-        size = tmp_img.get_size()
-        size = (size[0], size[1] + 159)  # This needs to be one pixel less to avoid small glitch
-        highscore_img = pg.Surface(size)
-        rect = tmp_img.get_rect()
-        context.highscore_height = rect.height
-        highscore_img.blit(tmp_img, dest=rect)
-        rect.y = rect.height
-        rect.height = 159
-        highscore_img.blit(tmp_img, dest=rect)
-        context.highscore_img = highscore_img
-        context.highscore_rect = pg.Rect((0, 0), (rect.width, HIGHSCORE_SCROLL_HEIGHT))
-        context.highscore_top = 0
-
-        # Highscore faders
-        out_fader = pg.Surface((rect.width, 20), pg.SRCALPHA)
-        for f in range(20, 0, -1):
-            out_fader.fill((0, 0, 0, f * (255 / 20)), ((0, 20 - f), (rect.width, 1)))
-
-        in_fader = pg.transform.flip(out_fader, False, True)
-
-        context.out_fader = out_fader
-        context.out_fader_rect = out_fader.get_rect()
-        context.out_fader_rect.midtop = (SCREEN_WIDTH // 2, HIGHSCORE_SCROLL_TOP_Y)
-        context.in_fader = in_fader
-        context.in_fader_rect = in_fader.get_rect()
-        context.in_fader_rect.midbottom = (SCREEN_WIDTH // 2, HIGHSCORE_SCROLL_TOP_Y + HIGHSCORE_SCROLL_HEIGHT)
+    def render_highscore(self, entry):
+        return ptext.getsurf(self.highscore_text(entry), fontsize=18, color=AMBER)
+
+    # The best HIGH_SCORES_SHOWN scores scroll by, however long the table is.
+    # The rows are left aligned, centered by the widest of them, and the
+    # faders are as wide.
+    def gameover_highscores(self, context):
+        entries = self.high_scores.top(HIGH_SCORES_SHOWN)
+        self.highscore_scroller.reset(len(entries))
+        width = max(self.render_highscore(entry).get_width() for entry in entries)
+        context.highscore_x = SCREEN_WIDTH // 2 - width // 2
+        self.create_faders(context.highscore_x, width)
+
+    # Faders over the top and bottom edges of the high scores, drawn every
+    # round. They are only made again when the width changes.
+    def create_faders(self, x, width):
+        if self.out_fader is None or self.out_fader.get_width() != width:
+            self.out_fader = pg.Surface((width, 20), pg.SRCALPHA)
+            for f in range(20, 0, -1):
+                self.out_fader.fill((0, 0, 0, f * (255 / 20)), ((0, 20 - f), (width, 1)))
+            self.in_fader = pg.transform.flip(self.out_fader, False, True)
+        self.out_fader_rect = self.out_fader.get_rect(topleft=(x, HIGHSCORE_SCROLL_TOP_Y))
+        self.in_fader_rect = self.in_fader.get_rect(bottomleft=(x, HIGHSCORE_SCROLL_TOP_Y + HIGHSCORE_SCROLL_HEIGHT))
 
     def gameover_event(self, context, event):
         if context.count < 50000 and event.type == pg.MOUSEBUTTONDOWN:
@@ -481,11 +695,8 @@ class Game:
                 context.high_score_name = context.high_score_name[:-1]
                 return
             if event.key == pg.K_RETURN:
-                self.high_scores.append((context.score, context.high_score_name))
-                self.high_scores.sort(key=lambda x: x[0], reverse=True)
-                self.high_scores = self.high_scores[:-1]
+                self.high_scores.insert(context.score, context.high_score_name)
                 context.is_high_score = False
-                self.save_highscores()
                 self.gameover_highscores(context)
                 return
             if event.unicode.isalnum() and len(context.high_score_name) < 8:
@@ -494,90 +705,261 @@ class Game:
     def gameover_update(self, context, delta_time):
         context.count -= delta_time
         if not context.is_high_score:
-            context.highscore_top += 0.5
-            context.highscore_rect.top = int(context.highscore_top)
-            if context.highscore_rect.top >= context.highscore_height:
-                context.highscore_top = 0
+            self.highscore_scroller.scroll(0.5)
 
         if context.count < context.end_jingle_start:
             context.end_jingle_start = -9999
-            SOUNDS["end"].play()
+            SOUNDS.play("end")
         if context.count < context.end_jingle_stop:
             context.end_jingle_stop = -9999
-            pg.mixer.music.load(GAME_OVER_SONG)
-            pg.mixer.music.play()
-            pg.mixer.music.set_endevent(END_MUSIC)
+            if self.music:
+                self.playlist.play_interlude(GAME_OVER_SONG, fade_ms=250)
 
         if context.count <= 0:
-            pg.mixer.music.fadeout(500)
+            if self.music:
+                self.playlist.fadeout(500, resume=True)
             return self.title_start
 
-    def gameover_draw(self, context, surface):
-        ptext.draw(
-            "GAME OVER",
-            center=(SCREEN_WIDTH // 2, 60),
-            color=AMBER,
-            fontsize=60,
-        )
-        surf, pos = ptext.draw(
-            f"SCORE: {context.score:05}", midtop=(SCREEN_WIDTH // 2, 150), fontsize=18, color=AMBER,
-        )
+    def gameover_draw(self, context, renderer):
+        renderer.blit("gameover", *self.gameover_text.draw())
+        self.final_score_text.text = f"SCORE: {context.score:05}"
+        renderer.blit("score", *self.final_score_text.draw())
         if context.is_high_score:
-            ptext.draw("YOU MADE HIGH SCORE!\nENTER YOUR NAME BELOW:", midtop=(SCREEN_WIDTH // 2, 100), fontsize=18,
-                       color=AMBER)
-            rect = surf.get_rect(topleft=pos)
+            renderer.blit("enter", *self.enter_name_text.draw())
+            rect = self.final_score_text.rect
             rect.right += 10
-            ptext.draw(
-                f"{context.high_score_name}\u258E", topleft=rect.topright, fontsize=18, color=AMBER
-            )
+            self.name_text.set(topleft=rect.topright)
+            self.name_text.text = f"{context.high_score_name}\u258E"
+            renderer.blit("name", *self.name_text.draw())
         else:
-            surface.blit(context.highscore_img, dest=(SCREEN_WIDTH // 2 - context.highscore_rect.width // 2, HIGHSCORE_SCROLL_TOP_Y), area=context.highscore_rect)
-            surface.blit(context.out_fader, dest=context.out_fader_rect)
-            surface.blit(context.in_fader, dest=context.in_fader_rect)
+            for i, (image, y, area) in enumerate(self.highscore_scroller.visible()):
+                renderer.blit(f"highscore{i}", image, (context.highscore_x, HIGHSCORE_SCROLL_TOP_Y + y), area=area)
+            renderer.blit("out_fader", self.out_fader, self.out_fader_rect.topleft)
+            renderer.blit("in_fader", self.in_fader, self.in_fader_rect.topleft)
 
         if context.count < 50000:
-            ptext.draw("PRESS MOUSE BUTTON TO RESTART", midbottom=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 5), fontsize=18, color=AMBER)
+            renderer.blit("restart", *self.restart_text.draw())
+
+    # Run one frame: pass the events to the current state, advance the
+    # simulation by delta_time milliseconds in fixed steps and draw it unless
+    # draw is False. If the frame took too long, at most MAX_CATCHUP_STEPS
+    # steps are run and the rest of the time is dropped. While the profiler
+    # is enabled the time of each phase is recorded.
+    def frame(self, events, delta_time, draw=True):
+        profiling = self.profiler.enabled
+        if profiling:
+            times = [time.perf_counter()]
+            state = self.state
+        event_handler, update_handler, draw_handler = self.game_state[self.state]
+        SOUNDS.begin_frame()
+
+        for event in events:
+            event_handler(self.context, event)
+        if profiling:
+            times.append(time.perf_counter())
+
+        self.accumulator += delta_time
+        steps = 0
+        next_state = None
+        while self.accumulator >= SIM_STEP:
+            if steps == MAX_CATCHUP_STEPS:
+                self.accumulator %= SIM_STEP
+                break
+            self.accumulator -= SIM_STEP
+            steps += 1
+            next_state = update_handler(self.context, SIM_STEP)
+            if next_state:
+                self.context = next_state(self.context)
+                self.renderer.invalidate()
+                break
+        if profiling:
+            times.append(time.perf_counter())
+
+        if draw and not next_state:
+            # Entities are drawn in between their previous and current state
+            self.alpha = self.accumulator / SIM_STEP
+            renderer = self.renderer
+            renderer.begin()
+            draw_handler(self.context, renderer)
+            if renderer.debug:
+                self.debug_text.text = f"{renderer.pixels} px"
+                renderer.blit("debug", *self.debug_text.draw())
+            if self.show_stats:
+                self.stats_text.text = "\n".join(self.stats_lines())
+                renderer.blit("stats", *self.stats_text.draw())
+            if self.show_profile:
+                self.update_profile_text()
+                renderer.blit("profile", *self.profile_text.draw())
+            rects = renderer.end()
+            if profiling:
+                times.append(time.perf_counter())
+            pg.display.update(rects)
+            if profiling:
+                times.append(time.perf_counter())
+        if profiling:
+            # Nothing was drawn
+            times += [times[-1]] * (5 - len(times))
+            self.profiler.record(STATE_NAMES[state], times)
+
+    # Toggle the frame profiler and its overlay. When the whole run is being
+    # profiled, only the overlay is toggled and the trace is kept.
+    def toggle_profile(self):
+        self.show_profile = not self.show_profile
+        self.profile_time = 0.0
+        if self.profile is None:
+            self.profiler.enabled = self.show_profile
+            self.profiler.reset()
+
+    # Show the first frame, and only then start the music, which opens the
+    # audio device in the background, so that it doesn't delay it
+    def start(self):
+        self.frame([], 0)
+        startup_phase("first frame")
+        if self.music:
+            self.playlist.start()
+
+    # Save the frame trace if the game was run with --profile, and quit
+    def quit(self):
+        if self.profile:
+            self.profiler.export(self.trace_file)
+        sys.exit()
 
     def game_loop(self):
+        self.start()
         while True:
-            delta_time = self.clock.tick(FPS)
-            self.screen.fill(BLACK)
-
-            event_handler, update_handler, draw_handler = self.game_state[self.state]
+            delta_time = self.clock.tick(MAX_RENDER_FPS)
+            events = self.get_events()
 
-            for event in pg.event.get():
+            for event in events:
                 if event.type == pg.QUIT:
-                    sys.exit()
+                    self.quit()
                 if event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
-                    sys.exit()
+                    self.quit()
+                if event.type == pg.KEYDOWN and event.key == pg.K_F1:
+                    # Toggle the dirty region overlay
+                    self.renderer.debug = not self.renderer.debug
+                    self.renderer.invalidate()
+                if event.type == pg.KEYDOWN and event.key == pg.K_F2:
+                    # Toggle the text cache statistics overlay
+                    self.show_stats = not self.show_stats
+                    ptext.COLLECT_STATS = self.show_stats
+                    ptext.resetstats()
+                    SOUNDS.resetstats()
+                if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                    self.toggle_profile()
+                if event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                    # Save the frames recorded by the profiler
+                    self.profiler.export(self.trace_file)
 
                 if event.type == END_MUSIC:
-                    self.song_index += 1
-                    if self.song_index == len(self.songs):
-                        last_song = self.songs[-1]
-                        self.songs = self.songs[:-1]
-                        random.shuffle(self.songs)
-                        self.songs.insert(
-                            random.randint(
-                                len(self.songs) // 4,
-                                len(self.songs) - len(self.songs) // 4 - 1,
-                            ),
-                            last_song,
-                        )
-                        self.song_index = 0
-                    pg.mixer.music.load(SONGS[self.song_index])
-                    pg.mixer.music.play()
-
-                event_handler(self.context, event)
-
-            next_state = update_handler(self.context, delta_time)
-            if next_state:
-                self.context = next_state(self.context)
-                continue  # Restart gameloop
-
-            draw_handler(self.context, self.screen)
-            pg.display.flip()
+                    self.playlist.on_end()
+
+            self.frame(events, delta_time)
+            if self.music:
+                self.playlist.frame(delta_time)
+
+
+# Plays the game on its own for simulations. Starts rounds, clicks towards the
+# nearest bubble every now and then and enters a name for high scores.
+class SimulatedPlayer:
+    CLICK_PROBABILITY = 0.1
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def click(self, pos):
+        return pg.event.Event(pg.MOUSEBUTTONDOWN, pos=pos, button=1)
+
+    def events(self, game):
+        context = game.context
+        if game.state == TITLE_SCREEN:
+            return [self.click((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))]
+        if game.state == GAME:
+            if self.rng.random() >= self.CLICK_PROBABILITY:
+                return []
+            bubbles = context.bubbles
+            slots = bubbles.slots()
+            if not len(slots):
+                return [self.click((self.rng.randint(50, 590), self.rng.randint(50, 430)))]
+            x, y = context.player.pos[0]
+            distances = (bubbles.x[slots] - x) ** 2 + (bubbles.y[slots] - y) ** 2
+            slot = slots[distances.argmin()]
+            return [self.click((int(bubbles.x[slot]), int(bubbles.y[slot])))]
+        if game.state == GAME_OVER:
+            if context.is_high_score:
+                return [
+                    pg.event.Event(pg.KEYDOWN, key=pg.K_s, unicode="s"),
+                    pg.event.Event(pg.KEYDOWN, key=pg.K_i, unicode="i"),
+                    pg.event.Event(pg.KEYDOWN, key=pg.K_m, unicode="m"),
+                    pg.event.Event(pg.KEYDOWN, key=pg.K_RETURN, unicode="\r"),
+                ]
+            if context.count < 50000:
+                return [self.click((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))]
+        return []
+
+
+# Run the given number of rounds without a window, sound or real time. The
+# same seed always gives the same scores. Returns the scores and the amount
+# of simulated game time in milliseconds.
+def simulate(rounds, seed=0, draw=False, stress=0, profile=None):
+    screen = init(headless=True)
+    clock = SyntheticClock()
+    game = Game(screen, stress=stress, rng=random.Random(seed), clock=clock, music=False, persist=False, profile=profile)
+    player = SimulatedPlayer(random.Random(seed + 1))
+    scores = []
+    while len(scores) < rounds:
+        state = game.state
+        game.frame(player.events(game), clock.tick(FPS), draw)
+        if state == GAME and game.state == GAME_OVER:
+            scores.append(game.context.score)
+    if profile:
+        game.profiler.export(profile)
+        print_profile(game.profiler)
+    return scores, clock.get_time()
+
+
+def print_profile(profiler):
+    for state, phases in profiler.stats().items():
+        print(f"{state:<12} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} ms")
+        for phase, times in phases.items():
+            print(f"  {phase:<10}" + "".join(f"{ms:9.3f}" for ms in times))
+
+
+# Start the game up to its first frame and print the time of each phase of
+# the startup. In headless mode there is no music and no high scores file.
+def profile_startup(headless):
+    game = Game(init(headless), music=not headless, persist=not headless)
+    game.start()
+    for name, seconds in STARTUP_PHASES:
+        print(f"{name:<12} {seconds * 1000:7.1f} ms")
+    print(f"{'total':<12} {sum(seconds for _, seconds in STARTUP_PHASES) * 1000:7.1f} ms")
 
 
 if __name__ == "__main__":
-    Game(screen=screen).game_loop()
+    parser = argparse.ArgumentParser(description="ÄH! - a simple clicking game")
+    parser.add_argument("--stress", type=int, default=0, metavar="N",
+                        help="keep at least N bubbles on the field")
+    parser.add_argument("--headless", action="store_true",
+                        help="simulate rounds without a window, sound or real time")
+    parser.add_argument("--rounds", type=int, default=100,
+                        help="number of rounds to simulate in headless mode")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed for headless mode")
+    parser.add_argument("--draw", action="store_true",
+                        help="draw every frame in headless mode")
+    parser.add_argument("--startup", action="store_true",
+                        help="print the time of each startup phase up to the first frame and quit")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile every frame and save the trace to FILE in the Chrome trace format")
+    args = parser.parse_args()
+    if args.startup:
+        profile_startup(args.headless)
+    elif args.headless:
+        start = time.perf_counter()
+        scores, game_time = simulate(args.rounds, args.seed, args.draw, args.stress, args.profile)
+        elapsed = time.perf_counter() - start
+        print(f"{len(scores)} rounds in {elapsed:.2f} s, {len(scores) / elapsed:.1f} rounds/s, "
+              f"{game_time / 1000 / elapsed:.0f}x real time")
+        print(f"scores: min {min(scores)}, max {max(scores)}, checksum {zlib.crc32(repr(scores).encode()):08x}")
+    else:
+        Game(screen=init(), stress=args.stress, profile=args.profile).game_loop()
@@ -0,0 +1,154 @@
+import threading
+import time
+import traceback
+from queue import Queue
+
+import pygame as pg
+
+_mixer_lock = threading.Lock()
+
+
+# Initialize the mixer if it isn't yet. Opening the audio device takes a
+# while, so it is only done when audio is first used, from whichever thread
+# that is.
+def init_mixer():
+    with _mixer_lock:
+        if not pg.mixer.get_init():
+            pg.mixer.init()
+
+
+# A named asset and the function that loads it. value is None while the asset
+# is not loaded. A kept asset stays loaded without references. load_time is the total time spent in loading it, which can
+# be more than one load if it was unloaded in between.
+class Asset:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.refs = 0
+        self.kept = False
+        self.loads = 0
+        self.load_time = 0.0
+        self.thread = None
+
+
+# Assets loaded on first use. Every asset is declared up front with a name and
+# a loader, and groups of assets can be declared, e.g. one per game state.
+# Acquiring a group loads its assets and takes a reference to each of them;
+# releasing it drops the references, and assets no longer referenced by any
+# group are unloaded, unless they are kept. Groups can also be loaded ahead of
+# time in a background thread, without taking references.
+class AssetManager:
+    def __init__(self):
+        self.assets = {}
+        self.groups = {}
+        # Held while loading or unloading, so that an asset the game asks for
+        # while the background thread is loading it is only loaded once.
+        self.lock = threading.RLock()
+        self.queue = None
+
+    def add(self, name, loader):
+        self.assets[name] = Asset(name, loader)
+
+    def image(self, name, path, colorkey=None):
+        def load():
+            image = pg.image.load(path).convert_alpha()
+            if colorkey is not None:
+                image.set_colorkey(colorkey)
+            return image
+
+        self.add(name, load)
+
+    def sound(self, name, path):
+        def load():
+            init_mixer()
+            return pg.mixer.Sound(path)
+
+        self.add(name, load)
+
+    def font(self, name, path, size):
+        self.add(name, lambda: pg.font.Font(path, size))
+
+    def group(self, name, names):
+        self.groups[name] = tuple(names)
+
+    # Keep the assets loaded once they have been loaded, for those that are
+    # needed again and again
+    def keep(self, names):
+        for name in names:
+            self.assets[name].kept = True
+
+    def get(self, name):
+        asset = self.assets[name]
+        value = asset.value
+        if value is None:
+            value = self.load(asset)
+        return value
+
+    def load(self, asset):
+        with self.lock:
+            if asset.value is None:
+                start = time.perf_counter()
+                asset.value = asset.loader()
+                asset.load_time += time.perf_counter() - start
+                asset.loads += 1
+                asset.thread = threading.current_thread().name
+            return asset.value
+
+    def acquire(self, group):
+        with self.lock:
+            for name in self.groups[group]:
+                asset = self.assets[name]
+                asset.refs += 1
+                self.load(asset)
+
+    def release(self, group):
+        with self.lock:
+            for name in self.groups[group]:
+                asset = self.assets[name]
+                asset.refs -= 1
+                if asset.refs == 0 and not asset.kept:
+                    asset.value = None
+
+    # Load the assets of the group in the background thread. Returns
+    # immediately; the lock is taken for one asset at a time.
+    def preload(self, group):
+        if self.queue is None:
+            self.queue = Queue()
+            threading.Thread(target=self.worker, name="asset-loader", daemon=True).start()
+        self.queue.put(group)
+
+    # Block until every group passed to preload has been loaded
+    def wait(self):
+        if self.queue is not None:
+            self.queue.join()
+
+    def worker(self):
+        while True:
+            group = self.queue.get()
+            try:
+                for name in self.groups[group]:
+                    self.load(self.assets[name])
+            except Exception:
+                # A failed load must not stop the loader, the game will try
+                # again on first use and get the error then.
+                traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    # For each asset whether it is loaded, its references, whether it is kept,
+    # the number of times and the total seconds it took to load, and the
+    # thread that last loaded it.
+    def stats(self):
+        with self.lock:
+            return {
+                name: {
+                    "loaded": asset.value is not None,
+                    "refs": asset.refs,
+                    "kept": asset.kept,
+                    "loads": asset.loads,
+                    "load_time": asset.load_time,
+                    "thread": asset.thread,
+                }
+                for name, asset in self.assets.items()
+            }
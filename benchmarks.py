@@ -0,0 +1,776 @@
+# Micro benchmarks for the hot paths of the game.
+#
+# Run with `python benchmarks.py [name ...]`. Without arguments every benchmark
+# is run. The SDL dummy drivers are used so that no window is opened.
+
+import gc
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame as pg  # noqa: E402
+
+
+def timeit(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, seconds, frames):
+    print(f"  {name:<32} {seconds / frames * 1000:8.3f} ms/frame")
+
+
+# The game module with the display opened and the assets loaded
+def game_module():
+    import ah
+
+    if pg.display.get_surface() is None:
+        ah.init(headless=True)
+    return ah
+
+
+def bench_sprite_cache():
+    ah = game_module()
+
+    frames = 120
+    print("Bubble drawing, rotozoom per frame vs. sprite cache")
+    for count in (10, 100, 1000):
+        random.seed(count)
+        bubbles = [
+            [
+                (random.randint(50, 590), random.randint(50, 430)),
+                random.uniform(0, 360),
+                random.uniform(-2.0, 2.0),
+                random.uniform(0.01, 1.0),
+            ]
+            for _ in range(count)
+        ]
+        surface = pg.Surface((640, 480))
+
+        def draw_rotozoom():
+            for _ in range(frames):
+                for bubble in bubbles:
+                    center, angle, rotation, scale = bubble
+                    bubble[1] = angle + rotation
+                    img = pg.transform.rotozoom(ah.ASSETS.get("bubble_image"), angle, scale)
+                    surface.blit(img, img.get_rect(center=center))
+
+        def draw_cached():
+            for _ in range(frames):
+                for bubble in bubbles:
+                    center, angle, rotation, scale = bubble
+                    bubble[1] = angle + rotation
+                    img = ah.ASSETS.get("bubble_frames").get(angle, scale)
+                    surface.blit(img, img.get_rect(center=center))
+
+        print(f" {count} bubbles")
+        report("rotozoom", timeit(draw_rotozoom), frames)
+        report("sprite cache", timeit(draw_cached), frames)
+
+
+def bench_bubble_field():
+    from bubblefield import BubbleField, bubble_score
+    from render import DirtyRenderer
+
+    ah = game_module()
+
+    frames = 60
+    player = pg.Rect(300, 220, 30, 30)
+    surface = pg.Surface((640, 480))
+    print("Bubble field update, collision and scoring (and drawing)")
+    for count in (1000, 10000, 100000):
+        rng = random.Random(count)
+
+        def fill():
+            field = BubbleField((ah.ASSETS.get("bubble_frames"), ah.ASSETS.get("special_frames")), ah.GAME_AREA)
+            field.spawn_many(
+                [rng.randint(50, 590) for _ in range(count)],
+                [rng.randint(50, 430) for _ in range(count)],
+                [rng.randint(1000, 7000) for _ in range(count)],
+                [rng.randint(0, 1) for _ in range(count)],
+                [rng.uniform(0, 360) for _ in range(count)],
+                [rng.uniform(-2.0, 2.0) for _ in range(count)],
+            )
+            return field
+
+        fields = [fill() for _ in range(5)]
+
+        def update():
+            field = fields.pop()
+            for _ in range(frames):
+                kinds, fractions = field.collide(player)
+                bubble_score(kinds, fractions)
+                field.update(16)
+
+        print(f" {count} bubbles")
+        report("update", timeit(update), frames)
+        field = fill()
+        renderer = DirtyRenderer(surface)
+
+        def draw():
+            for _ in range(10):
+                renderer.begin()
+                field.draw(renderer)
+                renderer.end()
+
+        report("draw", timeit(draw, repeat=2), 10)
+
+
+def bench_broadphase():
+    import numpy as np
+
+    from bubblefield import BubbleField
+
+    ah = game_module()
+
+    queries = 1000
+    print("Player vs. bubble collision queries, per query")
+    for count in (100, 1000, 10000, 100000):
+        rng = random.Random(count)
+        field = BubbleField((ah.ASSETS.get("bubble_frames"), ah.ASSETS.get("special_frames")), ah.GAME_AREA)
+        field.spawn_many(
+            [rng.randint(50, 590) for _ in range(count)],
+            [rng.randint(50, 430) for _ in range(count)],
+            [rng.randint(1000, 7000) for _ in range(count)],
+            [rng.randint(0, 1) for _ in range(count)],
+            [rng.uniform(0, 360) for _ in range(count)],
+            [rng.uniform(-2.0, 2.0) for _ in range(count)],
+        )
+        # Queries are tested without removing the hits, so the field stays
+        # the same between rounds.
+        players = [pg.Rect(rng.randint(50, 590), rng.randint(50, 430), 30, 30) for _ in range(queries)]
+        rects = [pg.Rect(int(x) - 16, int(y) - 16, 32, 32) for x, y in zip(field.x[:count], field.y[:count])]
+
+        def objects():
+            for player in players:
+                [rect for rect in rects if rect.colliderect(player)]
+
+        def brute_force():
+            for player in players:
+                slots = field.slots()
+                hw, hh = field.extents(slots)
+                x, y = field.x[slots], field.y[slots]
+                np.flatnonzero(
+                    (x - hw < player.right) & (x + hw > player.left)
+                    & (y - hh < player.bottom) & (y + hh > player.top)
+                )
+
+        def broadphase():
+            for player in players:
+                slots = np.array(field.broadphase.query(player, field.max_extent), dtype=np.int64)
+                hw, hh = field.extents(slots)
+                x, y = field.x[slots], field.y[slots]
+                np.flatnonzero(
+                    (x - hw < player.right) & (x + hw > player.left)
+                    & (y - hh < player.bottom) & (y + hh > player.top)
+                )
+
+        print(f" {count} bubbles")
+        for name, func in (("rect per bubble", objects), ("vectorized, all bubbles", brute_force),
+                           ("uniform grid", broadphase)):
+            seconds = timeit(func, repeat=3)
+            print(f"  {name:<32} {seconds / queries * 1e6:10.1f} us/query")
+
+
+def bench_text():
+    import ptext
+
+    game_module()
+
+    frames = 1000
+    print("HUD text, ptext.draw per frame vs. retained text objects")
+    hud = [
+        ("CLICK MOUSE BUTTON\nTO BEGIN", dict(center=(320, 240), fontsize=40)),
+        ("GAME OVER", dict(center=(320, 60), fontsize=60)),
+        ("SCORE: 00120", dict(topleft=(5, 5), fontsize=18)),
+        ("TIME LEFT: 12", dict(topleft=(500, 5), fontsize=18)),
+    ]
+    texts = [ptext.Text(text, color=(255, 176, 0), surf=None, **kwargs) for text, kwargs in hud]
+
+    def draw():
+        for _ in range(frames):
+            for text, kwargs in hud:
+                ptext.draw(text, color=(255, 176, 0), surf=None, **kwargs)
+
+    def retained():
+        for _ in range(frames):
+            for text, (value, _) in zip(texts, hud):
+                text.text = value
+                text.draw()
+
+    for name, func in (("ptext.draw", draw), ("ptext.Text", retained)):
+        report(name, timeit(func), frames)
+
+    print("Counter changing every frame, font rendering vs. glyph atlas")
+    for glyphs in (False, True):
+        counter = ptext.Text("", topleft=(5, 5), fontsize=18, color=(255, 176, 0), surf=None, glyphs=glyphs)
+        values = iter(range(10 ** 9))
+
+        def count():
+            for _ in range(frames):
+                counter.text = f"SCORE: {next(values):05}"
+                counter.draw()
+
+        ptext._font_cache.clear()
+        ptext._surf_cache.clear()
+        seconds = timeit(count)
+        name = "glyph atlas" if glyphs else "font.render"
+        report(name, seconds, frames)
+        print(f"  {'':<32} {len(ptext._surf_cache):8} new cached Surfaces")
+
+
+def bench_ptext():
+    import ptext
+
+    game_module()
+
+    calls = 20000
+    surface = pg.Surface((640, 480))
+    print("ptext calls with a Surface cache hit")
+    cases = (
+        ("draw", lambda: ptext.draw("SCORE: 00120", topleft=(5, 5), fontsize=18, color=(255, 176, 0), surf=surface)),
+        ("draw, surf=None", lambda: ptext.draw("SCORE: 00120", topleft=(5, 5), fontsize=18, color=(255, 176, 0),
+                                               surf=None)),
+        ("draw, outline", lambda: ptext.draw("GAME OVER", center=(320, 60), fontsize=60, owidth=1,
+                                             color=(255, 176, 0), surf=None)),
+        ("getsurf", lambda: ptext.getsurf("SCORE: 00120", fontsize=18, color=(255, 176, 0))),
+        # Unhashable arguments are resolved on every call
+        ("draw, unmemoized options", lambda: ptext.draw("SCORE: 00120", topleft=[5, 5], fontsize=18,
+                                                        color=(255, 176, 0), surf=None)),
+    )
+    for name, func in cases:
+        func()
+
+        def run():
+            for _ in range(calls):
+                func()
+
+        seconds = timeit(run)
+        print(f"  {name:<32} {calls / seconds:10.0f} calls/s")
+        if name == "draw":
+            ptext.COLLECT_STATS = True
+            seconds = timeit(run)
+            ptext.COLLECT_STATS = False
+            print(f"  {'draw, collecting stats':<32} {calls / seconds:10.0f} calls/s")
+
+    # An automatic clean() right after the Surface cache went over its budget
+    count = 20000
+    print(f"ptext.clean() with {count} cached Surfaces")
+    auto_clean, limit, factor = ptext.AUTO_CLEAN, ptext.MEMORY_LIMIT_MB, ptext.MEMORY_REDUCTION_FACTOR
+    ptext.AUTO_CLEAN = False
+    for i in range(count):
+        ptext.getsurf(f"{i}", fontsize=18)
+    ptext.MEMORY_LIMIT_MB = ptext._surf_cache.size / (1 << 20) * 0.999
+    ptext.MEMORY_REDUCTION_FACTOR = 0.998
+    start = time.perf_counter()
+    ptext.clean()
+    elapsed = time.perf_counter() - start
+    ptext.AUTO_CLEAN, ptext.MEMORY_LIMIT_MB, ptext.MEMORY_REDUCTION_FACTOR = auto_clean, limit, factor
+    print(f"  {'evict to just under the budget':<32} {elapsed * 1000:8.3f} ms")
+
+
+def bench_wrap():
+    import ptext
+
+    game_module()
+
+    rng = random.Random(1)
+    words = ["bubble", "worm", "click", "score", "a", "time", "ÄH!", "highscore", "of", "the"]
+    print("ptext line breaking of a single paragraph, per wrap")
+    for length in (1000, 10000, 100000):
+        text = ""
+        while len(text) < length:
+            text += rng.choice(words) + " "
+        text = text[:length]
+        for width in (None, 600):
+            def wrap():
+                ptext._wrap(text, fontsize=18, width=width, colortag={}, underlinetag=None, boldtag=None,
+                            italictag=None)
+
+            seconds = timeit(wrap, repeat=3)
+            name = f"{length} chars, width {width}"
+            print(f"  {name:<32} {seconds * 1000:8.3f} ms")
+
+
+def bench_gradient():
+    import ptext
+
+    game_module()
+
+    renders = 50
+    text = "GAME OVER\nYOU MADE HIGH SCORE!\nENTER YOUR NAME BELOW:"
+    print("Multi-line gradient text, rendered without the Surface cache, per render")
+    for fontsize in (18, 40, 60, 150):
+        def render(cold):
+            for _ in range(renders):
+                if cold:
+                    ptext._grad_cache.clear()
+                ptext.getsurf(text, fontsize=fontsize, color=(255, 176, 0), gcolor=(255, 0, 0), cache=False)
+
+        for cold in (True, False):
+            seconds = timeit(lambda: render(cold), repeat=3)
+            name = f"fontsize {fontsize}, {'new' if cold else 'cached'} gradient"
+            print(f"  {name:<32} {seconds / renders * 1000:8.3f} ms")
+
+
+def bench_outline():
+    import numpy as np
+
+    import ptext
+
+    game_module()
+
+    renders = 20
+    print("Outlined 150pt title, blit per circle point vs. dilation, per outline")
+    osurf = ptext.getsurf("ÄH!", fontsize=150, color=(0, 0, 255), background=(0, 0, 0, 0))
+    for owidth in (0.5, 1, 2, 4, 8):
+        opx = int(np.ceil(owidth * 150 * ptext.OUTLINE_UNIT))
+        surfs = {}
+        print(f" owidth {owidth} ({opx} px)")
+        for name, outline in (("blits", ptext._outlineblits), ("dilation", ptext._outlinedilate)):
+            surfs[name] = pg.Surface((osurf.get_width() + 2 * opx, osurf.get_height() + 2 * opx))
+
+            def render():
+                for _ in range(renders):
+                    surfs[name].fill((0, 0, 0))
+                    outline(surfs[name], osurf, opx)
+
+            seconds = timeit(render, repeat=3)
+            print(f"  {name:<32} {seconds / renders * 1000:8.3f} ms")
+        # Compare the two on a black background
+        diff = np.abs(
+            pg.surfarray.array3d(surfs["blits"]).astype(int) - pg.surfarray.array3d(surfs["dilation"])
+        ).max(axis=2)
+        print(f"  {'pixels differing by > 16':<32} {(diff > 16).mean() * 100:8.3f} %")
+
+
+def bench_effects():
+    import ptext
+
+    game_module()
+
+    renders = 50
+    print("Uncached renders of a 60pt string with effects, time and peak memory per render")
+    cases = (
+        ("outline", dict(owidth=1)),
+        ("shadow", dict(shadow=(1, 1))),
+        ("faded", dict(alpha=0.5)),
+        ("rotated", dict(angle=10)),
+        ("all four", dict(owidth=1, shadow=(1, 1), alpha=0.5, angle=10)),
+        ("all four, gradient", dict(owidth=1, shadow=(1, 1), alpha=0.5, angle=10, gcolor=(255, 0, 0))),
+    )
+    for name, kwargs in cases:
+        def render():
+            for _ in range(renders):
+                ptext.getsurf("GAME OVER", fontsize=60, color=(255, 176, 0), cache=False, **kwargs)
+
+        render()
+        seconds = timeit(render, repeat=3)
+        ptext.COLLECT_STATS = True
+        ptext.resetstats()
+        render()
+        ptext.COLLECT_STATS = False
+        peak = ptext.getstats()["effects_peak_bytes"]
+        print(f"  {name:<32} {seconds / renders * 1000:8.3f} ms {peak / 1024:8.0f} KiB")
+
+
+def bench_prewarm():
+    import statistics
+
+    import ptext
+
+    ah = game_module()
+
+    screen = pg.display.get_surface()
+    runs = 7
+    print(f"First frame of each screen with cold text caches, without and with pre-warming, median of {runs} runs")
+    prewarmasync = ptext.prewarmasync
+    for name in ("cold", "pre-warmed"):
+        if name == "cold":
+            ptext.prewarmasync = lambda items: None
+        runs_times = []
+        for _ in range(runs):
+            ptext._font_cache.clear()
+            ptext._surf_cache.clear()
+            ptext._glyph_atlases.clear()
+            game = ah.Game(screen, rng=random.Random(0), music=False, persist=False)
+            times = []
+            for next_state in (None, game.countdown_start, game.game_start, game.gameover_start, game.title_start):
+                # The previous screen showed long enough for the workers to finish
+                ptext.prewarmwait()
+                ah.ASSETS.wait()
+                gc.collect()
+                start = time.perf_counter()
+                if next_state is not None:
+                    game.context = next_state(game.context)
+                game.frame([], ah.SIM_STEP)
+                times.append(time.perf_counter() - start)
+                for _ in range(int(1000 / ah.SIM_STEP)):
+                    game.frame([], ah.SIM_STEP)
+            runs_times.append(times)
+        ptext.prewarmasync = prewarmasync
+        print(f"  {name:<32} " + " ".join(f"{statistics.median(t) * 1000:7.2f}" for t in zip(*runs_times)) + " ms")
+
+
+# Time to the first frame of the title screen, which is held to this budget
+FIRST_FRAME_BUDGET_MS = 150
+
+
+def bench_first_frame():
+    import statistics
+    import subprocess
+
+    runs = 9
+    print(f"Launch to the first frame without a window, median of {runs} runs")
+    phases = {}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "ah.py", "--headless", "--startup"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+        for line in output.splitlines():
+            name, _, value = line.rpartition(" ms")[0].rpartition(" ")
+            if name.strip():
+                phases.setdefault(name.strip(), []).append(float(value))
+    for name, times in phases.items():
+        print(f"  {name:<32} {statistics.median(times):8.1f} ms")
+    total = statistics.median(phases["total"])
+    verdict = "within" if total <= FIRST_FRAME_BUDGET_MS else "OVER"
+    print(f"  {verdict} the budget of {FIRST_FRAME_BUDGET_MS} ms")
+
+
+# Launches the game without a window and renders the text of every screen.
+# Prints the time of the whole launch and of the text alone, in seconds.
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import ah, ptext
+screen = ah.init(headless=True)
+ptext.DISK_CACHE_DIR = sys.argv[1] or None
+text_start = time.perf_counter()
+game = ah.Game(screen, music=False, persist=False)
+game.frame([], ah.SIM_STEP)
+game.prewarm_gameover()
+ptext.prewarmwait()
+end = time.perf_counter()
+print(end - start, end - text_start)
+"""
+
+
+def bench_startup():
+    import shutil
+    import subprocess
+    import tempfile
+
+    runs = 5
+    cache_dir = tempfile.mkdtemp()
+    print("Launch without a window, best of runs, text disk cache off vs. cold vs. warm")
+    try:
+        for name in ("no disk cache", "cold", "warm"):
+            best = None
+            for _ in range(runs):
+                if name == "cold":
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                output = subprocess.run(
+                    [sys.executable, "-c", STARTUP_SCRIPT, "" if name == "no disk cache" else cache_dir],
+                    capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                ).stdout
+                times = tuple(float(t) for t in output.split()[-2:])
+                best = times if best is None else min(best, times)
+            print(f"  {name:<32} {best[0] * 1000:8.1f} ms, text {best[1] * 1000:6.1f} ms")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+# Launches the game without a window up to the first frame of the title
+# screen, then plays through the states and waits for the assets. Prints the
+# time to the title, the assets the main thread loaded by then and the asset
+# statistics as JSON.
+ASSETS_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import ah
+game = ah.Game(ah.init(headless=True), music=False, persist=False)
+game.frame([], ah.SIM_STEP)
+title = time.perf_counter() - start
+loaded = [name for name, stats in ah.ASSETS.stats().items() if stats["thread"] == "MainThread"]
+game.context = game.countdown_start(game.context)
+game.context = game.game_start(game.context)
+game.context.score = 0
+game.context = game.gameover_start(game.context)
+ah.ASSETS.wait()
+print(json.dumps({"title": title, "loaded": loaded, "stats": ah.ASSETS.stats()}))
+"""
+
+
+def bench_assets():
+    import json
+    import subprocess
+
+    output = subprocess.run(
+        [sys.executable, "-c", ASSETS_SCRIPT],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    stats = result["stats"]
+    print("Asset loading")
+    print(f"  {'launch to first title frame':<32} {result['title'] * 1000:8.1f} ms")
+    print(f"  {'loaded on the main thread':<32} {', '.join(result['loaded']) or '-'}")
+    deferred = sum(asset["load_time"] for name, asset in stats.items() if name not in result["loaded"])
+    print(f"  {'deferred or in the background':<32} {deferred * 1000:8.1f} ms")
+    for name, asset in stats.items():
+        print(f"  {name:<32} {asset['load_time'] * 1000:8.2f} ms  {asset['thread']}")
+
+
+def bench_music():
+    from constants import SONGS
+    from music import Playlist
+
+    game_module()
+    changes = 6
+    print("Main thread time per track change, with the dummy audio driver")
+
+    def change_in_frame():
+        # As the game did, loading and starting the next song on the endevent
+        for song in SONGS[:changes]:
+            pg.mixer.music.load(song)
+            pg.mixer.music.play()
+
+    pg.mixer.init()
+    report("load and play in the frame", timeit(change_in_frame), changes)
+    pg.mixer.music.stop()
+
+    playlist = Playlist(SONGS, random.Random(0), pg.USEREVENT + 2)
+    playlist.start()
+    playlist.wait()
+    times = []
+    for _ in range(changes):
+        start = time.perf_counter()
+        playlist.on_end()
+        times.append(time.perf_counter() - start)
+        playlist.wait()
+    report("playlist, queued", min(times), 1)
+    pg.mixer.music.stop()
+    pg.mixer.quit()
+
+
+def bench_sound():
+    ah = game_module()
+
+    sounds = ah.SOUNDS
+    frames = 600
+    rng = random.Random(0)
+    print(f"Sound events for {frames} frames at 60 fps, about 600 a second")
+    sounds.resetstats()
+    events = 0
+    over_cap = 0
+    elapsed = 0.0
+    for frame in range(frames):
+        start = time.perf_counter()
+        sounds.begin_frame()
+        for _ in range(rng.randint(0, 20)):
+            sounds.play(rng.choice(("pick", "bubble")))
+            events += 1
+        if frame % 120 == 0:
+            sounds.play("end")
+            events += 1
+        # Held at one speed for a while, then slowing down
+        sounds.loop("player", 0.5 if frame % 60 < 30 else (60 - frame % 60) / 30)
+        elapsed += time.perf_counter() - start
+        over_cap += sum(sound.frame_plays > sound.max_per_frame for sound in sounds.sounds.values())
+    stats = sounds.stats()
+    report("per frame", elapsed, frames)
+    print(f"  {'per event':<32} {elapsed / events * 1000:8.3f} ms")
+    for name, count in stats.items():
+        print(f"  {name:<32} {count:8}")
+    busy = {name: sum(voice.channel.get_busy() for voice in category.voices) for name, category in sounds.categories.items()}
+    print(f"  {'channels playing':<32} " + "  ".join(f"{name} {count}" for name, count in busy.items()))
+    ok = over_cap == 0 and stats["dropped"] == 0 and stats["volume_changes"] < frames
+    print(f"  {'ok' if ok else 'FAILED'}: no sound over its cap or dropped, volume sent only on changes")
+
+
+def bench_highscores():
+    import shutil
+    import tempfile
+
+    from highscores import HighScores
+
+    size = 100000
+    inserts = 100
+    rng = random.Random(0)
+    table = [(rng.randint(0, 10 ** 6), "JANU") for _ in range(size)]
+    table.sort(key=lambda entry: entry[0], reverse=True)
+    scores = [rng.randint(0, 10 ** 6) for _ in range(inserts)]
+    print(f"High score table of {size} entries")
+
+    def insert_sort():
+        entries = list(table)
+        for score in scores:
+            entries.append((score, "NEW"))
+            entries.sort(key=lambda entry: entry[0], reverse=True)
+
+    high_scores = HighScores(table, capacity=size * 2)
+
+    def insert_bisect():
+        for score in scores:
+            high_scores.insert(score, "NEW")
+
+    report("insert, append and sort", timeit(insert_sort, repeat=1), inserts)
+    report("insert, bisect", timeit(insert_bisect, repeat=1), inserts)
+    report("page of 20 at rank 50000", timeit(lambda: high_scores.page(50000, 20), repeat=100), 1)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "highscore.json")
+        high_scores = HighScores(table, path, capacity=size * 2)
+        loaded = HighScores([], path, capacity=size * 2)
+
+        # The longest the game thread waits for the GIL while the background
+        # thread saves or loads
+        def longest_stall(done):
+            longest = 0.0
+            last = time.perf_counter()
+            while not done():
+                now = time.perf_counter()
+                longest = max(longest, now - last)
+                last = now
+            return longest
+
+        start = time.perf_counter()
+        high_scores.insert(0, "NEW")
+        report("save, on the game thread", time.perf_counter() - start, 1)
+        stall = longest_stall(lambda: high_scores.writes.unfinished_tasks == 0)
+        report("save, longest game thread stall", stall, 1)
+        start = time.perf_counter()
+        loaded.load()
+        report("load, on the game thread", time.perf_counter() - start, 1)
+        stall = longest_stall(lambda: not loaded.loader.is_alive())
+        report("load, longest game thread stall", stall, 1)
+        print(f"  {'entries loaded':<32} {len(loaded):8}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_highscore_scroll():
+    import ptext
+    from highscores import HighScores
+
+    ah = game_module()
+
+    screen = pg.display.get_surface()
+    frames = 600
+    print(f"High score table on the game over screen, set up after a name entry and {frames} frames of scrolling")
+    for size in (20, 1000, 100000):
+        rng = random.Random(size)
+        table = [(rng.randint(0, 99999), "".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=8))) for _ in range(size)]
+        game = ah.Game(screen, rng=random.Random(0), music=False, persist=False)
+        game.high_scores = HighScores(table, capacity=size)
+        game.highscore_scroller.page = game.high_scores.page
+        ptext._surf_cache.clear()
+
+        def whole_table():
+            # As the game did, the whole table as one surface, twice over
+            text = "".join(f"{score:04}  {name}\n" for score, name in game.high_scores.top(size))
+            image, _ = ptext.draw(text, topleft=(0, 0), fontsize=18, color=ah.AMBER, surf=None)
+            highscore_img = pg.Surface((image.get_width(), image.get_height() + 159))
+            highscore_img.blit(image, (0, 0))
+            highscore_img.blit(image, (0, image.get_height()), (0, 0, image.get_width(), 159))
+
+        context = ah.Context()
+
+        def scroller():
+            game.gameover_highscores(context)
+            game.highscore_scroller.visible()
+
+        def scroll():
+            for _ in range(frames):
+                game.highscore_scroller.scroll(0.5)
+                for image, y, area in game.highscore_scroller.visible():
+                    screen.blit(image, (context.highscore_x, ah.HIGHSCORE_SCROLL_TOP_Y + y), area)
+
+        if size <= 1000:
+            report(f"{size} rows, whole table set up", timeit(whole_table, repeat=1), 1)
+        ptext._surf_cache.clear()
+        report(f"{size} rows, scroller set up", timeit(scroller, repeat=1), 1)
+        report(f"{size} rows, scroller per frame", timeit(scroll, repeat=1), frames)
+
+
+def bench_profiler():
+    from profiler import FrameProfiler
+
+    ah = game_module()
+
+    screen = pg.display.get_surface()
+    frames = 3000
+    print(f"Frame profiler over {frames} simulated frames, off vs. on")
+    best = {}
+    # Taking turns, so that warming up doesn't count against either
+    for name in ("off", "on") * 3:
+        game = ah.Game(screen, rng=random.Random(0), music=False, persist=False)
+        player = ah.SimulatedPlayer(random.Random(1))
+        game.profiler.enabled = name == "on"
+
+        def run():
+            for _ in range(frames):
+                game.frame(player.events(game), ah.SIM_STEP)
+
+        seconds = timeit(run, repeat=1)
+        best[name] = min(best.get(name, seconds), seconds)
+    for name, seconds in best.items():
+        report(name, seconds, frames)
+
+    profiler = FrameProfiler()
+    times = [0.0, 0.001, 0.002, 0.003, 0.004]
+    records = 100000
+    report("record, per frame", timeit(lambda: [profiler.record("game", times) for _ in range(records)]), records)
+    report("stats of a full window", timeit(profiler.stats), 1)
+    report("trace events, per frame", timeit(profiler.trace_events, repeat=1), len(profiler.trace))
+
+
+def bench_headless():
+    import ah
+
+    rounds = 20
+    print("Headless simulation")
+    start = time.perf_counter()
+    scores, game_time = ah.simulate(rounds, seed=1)
+    elapsed = time.perf_counter() - start
+    print(f"  {rounds / elapsed:.1f} rounds/s, {game_time / 1000 / elapsed:.0f}x real time")
+
+
+BENCHMARKS = {
+    "sprite_cache": bench_sprite_cache,
+    "bubble_field": bench_bubble_field,
+    "broadphase": bench_broadphase,
+    "text": bench_text,
+    "ptext": bench_ptext,
+    "wrap": bench_wrap,
+    "gradient": bench_gradient,
+    "outline": bench_outline,
+    "effects": bench_effects,
+    "prewarm": bench_prewarm,
+    "startup": bench_startup,
+    "first_frame": bench_first_frame,
+    "assets": bench_assets,
+    "music": bench_music,
+    "sound": bench_sound,
+    "highscores": bench_highscores,
+    "highscore_scroll": bench_highscore_scroll,
+    "profiler": bench_profiler,
+    "headless": bench_headless,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,183 @@
+import numpy as np
+
+from spatial import UniformGrid
+
+BUBBLE = 0
+POWERUP = 1
+
+
+# All live bubbles of a game, kept in parallel NumPy arrays so that aging,
+# expiry, collision and scoring are single batched operations per frame.
+# Each bubble occupies a slot until it is removed, after which the slot is
+# reused. Only the first `high` slots are ever in use; `alive` tells which of
+# them hold a bubble. Slots are stable, which lets the broadphase grid refer to
+# bubbles by slot.
+class BubbleField:
+    FIELDS = (
+        ("x", np.float64),
+        ("y", np.float64),
+        ("lifetime", np.float64),
+        ("liferemaining", np.float64),
+        ("angle", np.float64),
+        ("rotation", np.float64),
+        ("kind", np.int8),
+        ("alive", np.bool_),
+    )
+    CELL_SIZE = 64
+
+    def __init__(self, frames, area, grid=None, capacity=64):
+        # frames is a sequence of RotozoomCaches indexed by bubble kind. If an
+        # OccupancyGrid is given, removed bubbles are released from it.
+        self.frames = frames
+        self.grid = grid
+        sizes = [cache.image.get_size() for cache in frames]
+        self.widths = np.array([w for w, _ in sizes], dtype=np.float64)
+        self.heights = np.array([h for _, h in sizes], dtype=np.float64)
+        # Largest half extent any rotated bubble can have
+        self.max_extent = 0.5 * float(np.hypot(self.widths, self.heights).max())
+        self.broadphase = UniformGrid(area, self.CELL_SIZE)
+        self.count = 0
+        self.high = 0
+        self.last_delta = 0
+        self.free = []
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, capacity):
+        if capacity <= len(self.x):
+            return
+        capacity = max(capacity, 2 * len(self.x))
+        for name, dtype in self.FIELDS:
+            array = np.zeros(capacity, dtype=dtype)
+            array[:self.high] = getattr(self, name)[:self.high]
+            setattr(self, name, array)
+
+    def allocate(self, n):
+        reused = self.free[len(self.free) - n:] if n else []
+        del self.free[len(self.free) - len(reused):]
+        new = n - len(reused)
+        self.reserve(self.high + new)
+        slots = np.array(reused + list(range(self.high, self.high + new)), dtype=np.int64)
+        self.high += new
+        self.count += n
+        return slots
+
+    def spawn(self, pos, lifetime, kind, angle, rotation):
+        self.spawn_many([pos[0]], [pos[1]], [lifetime], [kind], [angle], [rotation])
+
+    def spawn_many(self, xs, ys, lifetimes, kinds, angles, rotations):
+        slots = self.allocate(len(xs))
+        self.x[slots] = xs
+        self.y[slots] = ys
+        self.lifetime[slots] = lifetimes
+        self.liferemaining[slots] = lifetimes
+        self.kind[slots] = kinds
+        self.angle[slots] = angles
+        self.rotation[slots] = rotations
+        self.alive[slots] = True
+        insert = self.broadphase.insert
+        for slot, x, y in zip(slots.tolist(), self.x[slots].tolist(), self.y[slots].tolist()):
+            insert(slot, x, y)
+
+    def remove(self, slots):
+        if not len(slots):
+            return
+        self.alive[slots] = False
+        remove = self.broadphase.remove
+        for slot, x, y in zip(slots.tolist(), self.x[slots].tolist(), self.y[slots].tolist()):
+            remove(slot, x, y)
+            if self.grid is not None:
+                self.grid.remove(x, y)
+        self.count -= len(slots)
+        if self.count:
+            self.free.extend(slots.tolist())
+        else:
+            self.free = []
+            self.high = 0
+
+    def slots(self):
+        return np.flatnonzero(self.alive[:self.high])
+
+    def scales(self, slots):
+        return self.liferemaining[slots] / self.lifetime[slots]
+
+    # Half width and half height of the rotated and scaled bubble images,
+    # i.e. of the rect rotozoom would produce.
+    def extents(self, slots):
+        kind = self.kind[slots]
+        radians = np.radians(self.angle[slots])
+        cos, sin = np.abs(np.cos(radians)), np.abs(np.sin(radians))
+        w, h = self.widths[kind], self.heights[kind]
+        scale = 0.5 * self.scales(slots)
+        return scale * (w * cos + h * sin), scale * (w * sin + h * cos)
+
+    # Remove all bubbles touching the rect. Returns the kinds and the remaining
+    # life fractions of the removed bubbles. Only the bubbles in the grid cells
+    # near the rect are tested.
+    def collide(self, rect):
+        slots = self.broadphase.query(rect, self.max_extent)
+        if not slots:
+            return self.kind[:0], self.lifetime[:0]
+        slots = np.array(slots, dtype=np.int64)
+        hw, hh = self.extents(slots)
+        x, y = self.x[slots], self.y[slots]
+        hit = (
+            (x - hw < rect.right) & (x + hw > rect.left)
+            & (y - hh < rect.bottom) & (y + hh > rect.top)
+        )
+        if not hit.any():
+            return self.kind[:0], self.lifetime[:0]
+        slots = slots[hit]
+        kinds = self.kind[slots]
+        fractions = self.scales(slots)
+        self.remove(slots)
+        return kinds, fractions
+
+    # Age and rotate all bubbles and drop the ones whose life ran out. Returns
+    # the number of expired bubbles.
+    def update(self, delta_time):
+        self.last_delta = delta_time
+        h = self.high
+        self.angle[:h] += self.rotation[:h]
+        self.liferemaining[:h] -= delta_time
+        expired = np.flatnonzero(self.alive[:h] & (self.liferemaining[:h] <= 0))
+        self.remove(expired)
+        return len(expired)
+
+    # alpha is the fraction of a simulation step passed since the last update,
+    # bubbles are drawn in between their previous and current state.
+    def draw(self, renderer, alpha=1.0):
+        slots = self.slots()
+        n = len(slots)
+        if not n:
+            return
+        kinds = self.kind[slots]
+        lag = 1.0 - alpha
+        scales = (self.liferemaining[slots] + lag * self.last_delta) / self.lifetime[slots]
+        np.minimum(scales, 1.0, out=scales)
+        angles = self.angle[slots] - lag * self.rotation[slots]
+        angle_index = np.empty(n, dtype=np.int64)
+        scale_index = np.empty(n, dtype=np.int64)
+        for kind, cache in enumerate(self.frames):
+            selected = kinds == kind
+            angle_index[selected] = np.rint(angles[selected] / cache.angle_step) % cache.angle_count
+            scale_index[selected] = np.rint(scales[selected] * cache.scale_steps)
+        frames = self.frames
+        blit = renderer.blit
+        for slot, kind, ai, si, x, y in zip(slots.tolist(), kinds.tolist(), angle_index.tolist(),
+                                            scale_index.tolist(), self.x[slots].tolist(), self.y[slots].tolist()):
+            img = frames[kind].frame((ai, si))
+            w, h = img.get_size()
+            blit(("bubble", slot), img, (int(x) - w // 2, int(y) - h // 2))
+
+
+# Points awarded for the collected normal bubbles, the faster the bubble was
+# caught the more points it gives.
+def bubble_score(kinds, fractions):
+    fractions = fractions[kinds == BUBBLE]
+    if not len(fractions):
+        return 0
+    return int(np.maximum((fractions * 20).astype(np.int64), 1).sum())
@@ -1,12 +1,13 @@
 pyinstaller ^
     --clean ^
     --additional-hooks-dir hooks ^
+    --hidden-import bubblefield ^
     --icon gfx/ah-game-icons.ico ^
-    --onefile ^
+    --onedir ^
     -w ^
     ah.py
 
-xcopy /Y /I fonts dist\fonts
-xcopy /Y /I music dist\music
-xcopy /Y /I sfx dist\sfx
-xcopy /Y /I gfx dist\gfx
+xcopy /Y /I fonts dist\ah\fonts
+xcopy /Y /I music dist\ah\music
+xcopy /Y /I sfx dist\ah\sfx
+xcopy /Y /I gfx dist\ah\gfx
@@ -2,12 +2,21 @@ import pygame as pg
 
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
+# The game is simulated in fixed steps of SIM_STEP milliseconds, FPS steps a
+# second. Rendering runs at the display rate, up to MAX_RENDER_FPS.
 FPS = 60
+SIM_STEP = 1000 / FPS
+MAX_CATCHUP_STEPS = 5
+MAX_RENDER_FPS = 240
 TITLE_SCREEN = 1
 GAME = 2
 GAME_OVER = 3
 GAME_COUNTDOWN = 4
 GAME_AREA = pg.Rect((0, 40), (639, 400))
+SPAWN_AREA = pg.Rect((50, 50), (541, 381))
+BUBBLE_SPACING = 40
+PLAYER_CLEARANCE = 60
+MAX_SPAWN_ATTEMPTS = 30
 BLACK = (0, 0, 0)
 AMBER = (255, 191, 0)
 GREEN = (51, 255, 0)
@@ -21,6 +30,17 @@ SONGS = (
 )
 GAME_OVER_SONG = "music/cyber-teen.ogg"
 HIGH_SCORES = [(idx * 10, "JANU") for idx in range(20, 0, -1)]
+# The best HIGH_SCORES_SHOWN scores are shown, HIGH_SCORES_KEPT are saved
+HIGH_SCORES_SHOWN = 20
+HIGH_SCORES_KEPT = 100000
 
 HIGHSCORE_SCROLL_TOP_Y = 200
-HIGHSCORE_SCROLL_HEIGHT = 160
\ No newline at end of file
+HIGHSCORE_SCROLL_HEIGHT = 160
+HIGHSCORE_ROW_HEIGHT = 20
+
+# Pre-rendered bubble frames. Angles are snapped to SPRITE_ANGLE_STEP degrees
+# and scales to 1 / SPRITE_SCALE_STEPS.
+SPRITE_ANGLE_STEP = 2
+SPRITE_SCALE_STEPS = 32
+SPRITE_CACHE_MB = 16
+SPRITE_CACHE_PRERENDER = False
@@ -0,0 +1,205 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import traceback
+from bisect import bisect_right
+from queue import Queue
+
+# Bytes of the file read and parsed at a time
+PARSE_BATCH = 32768
+
+
+# Parse a table saved one entry per line into its scores and names, a batch
+# of lines at a time. One json.load of a big table would hold the GIL, and so
+# stop the game, for as long as it takes, while in between batches the game
+# thread can run. Other layouts are parsed as a whole.
+def parse(f):
+    try:
+        if f.readline().strip() == "[":
+            return parse_batches(read_batches(f))
+    except ValueError:
+        pass
+    f.seek(0)
+    return parse_batches([f.read()])
+
+
+def read_batches(f):
+    while True:
+        lines = f.readlines(PARSE_BATCH)
+        if not lines:
+            raise ValueError("The high score table is cut short")
+        lines = [line.strip().rstrip(",") for line in lines]
+        end = lines[-1] == "]"
+        if end:
+            lines.pop()
+        yield "[" + ",".join(lines) + "]"
+        if end:
+            return
+
+
+def parse_batches(batches):
+    scores = []
+    names = []
+    for batch in batches:
+        for score, name in json.loads(batch):
+            scores.append(int(score))
+            names.append(str(name))
+    return scores, names
+
+
+# The high score table, best first. Scores are inserted by bisection after
+# any equal ones, and only the best `capacity` are kept. The scores and names
+# are kept in two lists rather than as pairs, which would make a big table
+# slow down garbage collection.
+#
+# With a path the table is kept in a JSON file, one entry per line. Loading
+# and saving happen in a background thread. The table holds the default
+# scores until the file has been read, and every method waits for that, so
+# load can be called before the first frame without delaying it as long as
+# nothing asks for the scores until later. Each insert writes the whole
+# table to a temporary file which then replaces the old one, so a crash
+# can't leave it half written. The previous table is kept as a backup and
+# read if the file turns out to be broken anyway. If neither exists but there
+# is a table at old_path, where an older version kept it, that is read instead
+# and saved to the path.
+class HighScores:
+    def __init__(self, default, path=None, capacity=100000, old_path=None):
+        self.path = path
+        self.capacity = capacity
+        self.old_path = old_path
+        self.loader = None
+        self.writes = None
+        self.set_scores([score for score, _ in default], [name for _, name in default])
+
+    def set_scores(self, scores, names):
+        # Negated, ascending, for bisect
+        keys = [-score for score in scores]
+        if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            keys = [keys[i] for i in order]
+            names = [names[i] for i in order]
+        self.keys = keys[:self.capacity]
+        self.names = names[:self.capacity]
+
+    def backup_path(self):
+        return self.path + ".bak"
+
+    def load(self):
+        if self.path is not None:
+            self.loader = threading.Thread(target=self.read, name="highscore-loader", daemon=True)
+            self.loader.start()
+
+    def read(self):
+        paths = [self.path, self.backup_path()]
+        migrate = self.old_path is not None and not any(os.path.exists(path) for path in paths)
+        if migrate:
+            paths = [self.old_path]
+        for path in paths:
+            try:
+                with open(path, "rt", encoding="utf-8") as f:
+                    scores, names = parse(f)
+                self.set_scores(scores, names)
+                if migrate:
+                    self.save()
+                return
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, TypeError):
+                traceback.print_exc()
+
+    # Wait for the file to be read
+    def wait_loaded(self):
+        if self.loader is not None:
+            self.loader.join()
+            self.loader = None
+
+    def __len__(self):
+        self.wait_loaded()
+        return len(self.keys)
+
+    # The scores from position start on, at most count of them
+    def page(self, start, count):
+        self.wait_loaded()
+        return [(-key, name) for key, name in zip(self.keys[start:start + count], self.names[start:start + count])]
+
+    def top(self, count):
+        return self.page(0, count)
+
+    # The position an inserted score would get
+    def rank(self, score):
+        self.wait_loaded()
+        return bisect_right(self.keys, -score)
+
+    # Whether the score would make it into the top count. A score equal to the
+    # last one shown qualifies, although it is inserted after it.
+    def qualifies(self, score, count):
+        self.wait_loaded()
+        return len(self.keys) < count or score >= -self.keys[count - 1]
+
+    # Insert the score and save the table. Returns its position.
+    def insert(self, score, name):
+        position = self.rank(score)
+        if position < self.capacity:
+            self.keys.insert(position, -score)
+            self.names.insert(position, name)
+            if len(self.keys) > self.capacity:
+                self.keys.pop()
+                self.names.pop()
+            self.save()
+        return position
+
+    def save(self):
+        if self.path is None:
+            return
+        if self.writes is None:
+            self.writes = Queue()
+            threading.Thread(target=self.writer, name="highscore-writer", daemon=True).start()
+            # The last scores are written before the game exits
+            atexit.register(self.flush)
+        self.writes.put((list(self.keys), list(self.names)))
+
+    # Block until every save has been written
+    def flush(self):
+        if self.writes is not None:
+            self.writes.join()
+
+    def writer(self):
+        while True:
+            table = self.writes.get()
+            # Only the latest of the tables waiting to be saved is written
+            taken = 1
+            while not self.writes.empty():
+                table = self.writes.get()
+                taken += 1
+            try:
+                self.write(*table)
+            except OSError:
+                traceback.print_exc()
+            finally:
+                for _ in range(taken):
+                    self.writes.task_done()
+
+    def write(self, keys, names):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".highscore-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wt", encoding="utf-8") as f:
+                f.write("[\n")
+                # A line at a time, so that the game thread can run in between
+                for i, (key, name) in enumerate(zip(keys, names)):
+                    f.write(("" if i == 0 else ",\n") + json.dumps([-key, name]))
+                f.write("\n]\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.path):
+                os.replace(self.path, self.backup_path())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
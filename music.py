@@ -0,0 +1,166 @@
+import io
+import threading
+import traceback
+from queue import Queue
+
+import pygame as pg
+
+from assets import init_mixer
+
+# Frames within this many milliseconds of a track change count towards its
+# worst frame time
+TRACK_CHANGE_WINDOW_MS = 500
+TRACK_CHANGE_HISTORY = 10
+
+
+# Background music. The songs are shuffled, and reshuffled once all of them
+# have played, with the song that played last moved away from the start so
+# that it isn't heard again soon. The next song is always queued with
+# pygame.mixer.music.queue while the current one plays.
+#
+# The game thread only decides what plays next. Reading the files and every
+# call into pygame.mixer.music, which decodes, happen in a background thread,
+# so that changing tracks costs the frame nothing but putting a command in a
+# queue. The worst frame time after each track change is kept in
+# track_changes, in milliseconds.
+class Playlist:
+    def __init__(self, songs, rng, endevent):
+        self.songs = list(songs)
+        self.rng = rng
+        self.rng.shuffle(self.songs)
+        self.index = 0
+        self.endevent = endevent
+        # The song queued to play after the current one, until it starts
+        self.queued = None
+        self.fading = False
+        self.resume = False
+        self.commands = None
+        # Read by the background thread only
+        self.preloaded = {}
+        self.files = []
+        self.watch_left = 0
+        self.worst_frame = 0
+        self.track_changes = []
+
+    def next_song(self):
+        if self.index == len(self.songs):
+            last_song = self.songs[-1]
+            self.songs = self.songs[:-1]
+            self.rng.shuffle(self.songs)
+            self.songs.insert(
+                self.rng.randint(len(self.songs) // 4, len(self.songs) - len(self.songs) // 4 - 1),
+                last_song,
+            )
+            self.index = 0
+        song = self.songs[self.index]
+        self.index += 1
+        return song
+
+    def start(self):
+        self.send("play", self.next_song())
+        self.queue(self.next_song())
+
+    def queue(self, song):
+        self.queued = song
+        self.send("queue", song)
+
+    # Call on every endevent, which is posted when a song ends, whether the
+    # queued one starts or the music stops after fading out
+    def on_end(self):
+        if not self.fading:
+            self.queued = None
+            self.queue(self.next_song())
+        else:
+            self.fading = False
+            if not self.resume:
+                return
+            # The queued song was dropped by the fade, so it plays now
+            song = self.queued or self.next_song()
+            self.send("play", song)
+            self.queue(self.next_song())
+        self.watch()
+
+    # Fade the music out. With resume=True the playlist continues afterwards,
+    # otherwise the music stays silent until the next play_interlude.
+    def fadeout(self, fade_ms, resume):
+        self.fading = True
+        self.resume = resume
+        self.send("fadeout", fade_ms)
+
+    # Read a song into memory ahead of play_interlude
+    def preload(self, song):
+        self.send("preload", song)
+
+    # Play a song that is not on the playlist, fading it in, and continue with
+    # the playlist after it
+    def play_interlude(self, song, fade_ms=0):
+        self.fading = False
+        self.send("play", song, fade_ms)
+        self.queue(self.queued or self.next_song())
+        self.watch()
+
+    def watch(self):
+        self.watch_left = TRACK_CHANGE_WINDOW_MS
+        self.worst_frame = 0
+
+    # Call every frame with its duration in milliseconds
+    def frame(self, delta_time):
+        if self.watch_left > 0:
+            self.worst_frame = max(self.worst_frame, delta_time)
+            self.watch_left -= delta_time
+            if self.watch_left <= 0:
+                self.track_changes = self.track_changes[-(TRACK_CHANGE_HISTORY - 1):] + [self.worst_frame]
+
+    def send(self, command, *args):
+        if self.commands is None:
+            self.commands = Queue()
+            threading.Thread(target=self.worker, name="music", daemon=True).start()
+        self.commands.put((command, args))
+
+    # Wait until the background thread has carried out every command sent
+    def wait(self):
+        if self.commands is not None:
+            self.commands.join()
+
+    def worker(self):
+        try:
+            init_mixer()
+            pg.mixer.music.set_endevent(self.endevent)
+        except pg.error:
+            traceback.print_exc()
+        while True:
+            command, args = self.commands.get()
+            try:
+                getattr(self, "do_" + command)(*args)
+            except (pg.error, OSError):
+                # A song that can't be played is skipped
+                traceback.print_exc()
+            finally:
+                self.commands.task_done()
+
+    def read(self, song):
+        data = self.preloaded.pop(song, None)
+        if data is None:
+            with open(song, "rb") as f:
+                data = f.read()
+        # The mixer reads from the file while the song plays, so the playing
+        # and the queued one are kept referenced
+        self.files = self.files[-1:] + [io.BytesIO(data)]
+        return self.files[-1]
+
+    def do_play(self, song, fade_ms=0):
+        pg.mixer.music.load(self.read(song))
+        pg.mixer.music.play(fade_ms=fade_ms)
+
+    def do_queue(self, song):
+        if pg.mixer.music.get_busy():
+            pg.mixer.music.queue(self.read(song))
+        else:
+            self.do_play(song)
+
+    def do_fadeout(self, fade_ms):
+        pg.mixer.music.fadeout(fade_ms)
+
+    def do_preload(self, song):
+        with open(song, "rb") as f:
+            self.preloaded[song] = f.read()
@@ -0,0 +1,76 @@
+import json
+import math
+import time
+from collections import deque
+
+# The phases of a frame, in order
+PHASES = ("events", "update", "draw", "display")
+
+
+# The value below which the given percentage of the sorted values fall
+def percentile(values, percent):
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+# Frame times split by phase and by game state. The last `window` frames of
+# each state are kept for the percentiles, and the last `trace_frames`
+# frames of all states for the trace, which can be saved in the Chrome trace
+# event format and opened in chrome://tracing or Perfetto.
+#
+# Nothing is recorded while enabled is False, which the game checks before
+# taking any time, so a disabled profiler costs one attribute lookup a frame.
+class FrameProfiler:
+    def __init__(self, window=600, trace_frames=36000):
+        self.enabled = False
+        self.window = window
+        self.samples = {}
+        self.trace = deque(maxlen=trace_frames)
+        self.start = time.perf_counter()
+
+    # Record a frame of the state from perf_counter times taken at its start
+    # and at the end of each phase. A phase that didn't run ends where the
+    # previous one did.
+    def record(self, state, times):
+        samples = self.samples.get(state)
+        if samples is None:
+            samples = self.samples[state] = {phase: deque(maxlen=self.window) for phase in PHASES + ("frame",)}
+        for phase, start, end in zip(PHASES, times, times[1:]):
+            samples[phase].append(end - start)
+        samples["frame"].append(times[-1] - times[0])
+        self.trace.append((state, times))
+
+    def reset(self):
+        self.samples.clear()
+        self.trace.clear()
+
+    # The p50, p95, p99 and maximum time of each phase and of the whole frame
+    # in milliseconds, by state
+    def stats(self):
+        stats = {}
+        for state, samples in self.samples.items():
+            stats[state] = {}
+            for phase, times in samples.items():
+                times = sorted(times)
+                stats[state][phase] = tuple(
+                    percentile(times, percent) * 1000 for percent in (50, 95, 99, 100)
+                )
+        return stats
+
+    # The trace as Chrome trace events: a complete event for each frame with
+    # the state as its name, and one for each phase inside it. Times are in
+    # microseconds.
+    def trace_events(self):
+        events = [{"name": "thread_name", "ph": "M", "pid": 0, "tid": 0, "args": {"name": "game loop"}}]
+        for state, times in self.trace:
+            start = (times[0] - self.start) * 1e6
+            events.append(dict(name=state, cat="frame", ph="X", pid=0, tid=0, ts=start,
+                               dur=(times[-1] - times[0]) * 1e6))
+            for phase, phase_start, phase_end in zip(PHASES, times, times[1:]):
+                if phase_end > phase_start:
+                    events.append(dict(name=phase, cat=state, ph="X", pid=0, tid=0,
+                                       ts=(phase_start - self.start) * 1e6, dur=(phase_end - phase_start) * 1e6))
+        return events
+
+    def export(self, path):
+        with open(path, "wt", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
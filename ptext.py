@@ -8,9 +8,28 @@
 from __future__ import division, print_function
 
 from math import ceil, sin, cos, radians, exp
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from operator import attrgetter
+from time import perf_counter
+from functools import wraps
+import threading, queue, traceback
+import os, mmap, struct, hashlib, tempfile
 import pygame
 
+# numpy is optional. It is slow to import, so it is only imported for the first gradient.
+numpy = None
+_numpy_imported = False
+def _importnumpy():
+	global numpy, _numpy_imported
+	if not _numpy_imported:
+		_numpy_imported = True
+		try:
+			import numpy
+			import pygame.surfarray
+		except ImportError:
+			numpy = None
+	return numpy
+
 DEFAULT_FONT_SIZE = 24
 REFERENCE_FONT_SIZE = 100
 DEFAULT_LINE_HEIGHT = 1.0
@@ -24,6 +43,8 @@ DEFAULT_OUTLINE_COLOR = "black"
 DEFAULT_SHADOW_COLOR = "black"
 OUTLINE_UNIT = 1 / 24
 SHADOW_UNIT = 1 / 18
+# Outlines at least this many pixels wide are made by dilation (see _outlinedilate)
+OUTLINE_DILATE_MIN_PX = 6
 DEFAULT_ALIGN = "left"  # left, center, or right
 DEFAULT_ANCHOR = 0, 0  # 0, 0 = top left ;  1, 1 = bottom right
 DEFAULT_STRIP = True
@@ -37,54 +58,226 @@ DEFAULT_COLOR_TAG = {}
 AUTO_CLEAN = True
 MEMORY_LIMIT_MB = 64
 MEMORY_REDUCTION_FACTOR = 0.5
+OPTIONS_CACHE_SIZE = 256
+# Budgets of the other caches, in number of entries unless given in MB. They can be changed at any
+# time and take effect on the next insertion.
+FONT_CACHE_SIZE = 32
+FIT_CACHE_SIZE = 1024
+GRAD_CACHE_MB = 4
+CIRCLE_CACHE_SIZE = 64
+UNROTATED_CACHE_SIZE = 1024
+GLYPH_ATLAS_CACHE_SIZE = 32
+# Directory where rendered Surfaces are kept between runs, or None to not keep them. Only Surfaces
+# estimated at DISK_CACHE_MIN_KB or more are written. See _diskpath and _diskcacheable.
+DISK_CACHE_DIR = None
+DISK_CACHE_MIN_KB = 16
+# Count cache hits and misses and time font rendering and wrapping. See getstats.
+COLLECT_STATS = False
+
+# Fonts, the caches and the scratch Surfaces are shared with the prewarm worker thread, so the
+# public functions hold _lock while they run. It is reentrant, since they call each other.
+_lock = threading.RLock()
+def _locked(func):
+	@wraps(func)
+	def locked(*args, **kwargs):
+		with _lock:
+			return func(*args, **kwargs)
+	return locked
+
+# Bounded cache that evicts the least recently used entries. Lookups, insertions and evictions are
+# all O(1). limit is a callable returning the budget, so that it follows the module settings, and
+# sizeof gives the cost of a value in bytes (by default each entry costs 1). A cache without a
+# limit only shrinks when shrink is called. Caches are registered by name for getstats.
+class _LRUCache(object):
+	def __init__(self, name, limit=None, sizeof=None):
+		self.limit = limit
+		self.sizeof = sizeof
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._entries = OrderedDict()
+		_caches[name] = self
+	def __len__(self):
+		return len(self._entries)
+	def __contains__(self, key):
+		return key in self._entries
+	def __iter__(self):
+		return iter(self._entries)
+	def get(self, key, default=None):
+		entry = self._entries.get(key)
+		if entry is None:
+			if COLLECT_STATS:
+				self.misses += 1
+			return default
+		if COLLECT_STATS:
+			self.hits += 1
+		self._entries.move_to_end(key)
+		return entry[0]
+	def __getitem__(self, key):
+		value, _ = self._entries[key]
+		self._entries.move_to_end(key)
+		return value
+	def __setitem__(self, key, value):
+		if key in self._entries:
+			del self[key]
+		size = 1 if self.sizeof is None else self.sizeof(value)
+		self._entries[key] = value, size
+		self.size += size
+		if self.limit is not None:
+			self.shrink(self.limit())
+	def __delitem__(self, key):
+		_, size = self._entries.pop(key)
+		self.size -= size
+	def clear(self):
+		self._entries.clear()
+		self.size = 0
+	def shrink(self, limit):
+		while self.size > limit and self._entries:
+			_, (_, size) = self._entries.popitem(last=False)
+			self.size -= size
+			self.evictions += 1
+	def stats(self):
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"entries": len(self._entries),
+			"bytes": self.size if self.sizeof is not None else None,
+		}
 
-pygame.font.init()
+_caches = {}
+_stats = {}
+
+# Snapshot of the statistics: for each cache its hits, misses, evictions, number of entries and
+# size in bytes (None for caches that only count entries), the total time in seconds and number
+# of calls spent in font rendering and in text wrapping, the number of renders with effects and
+# the largest peak memory in bytes of one of them, the memory held by scratch Surfaces, and the
+# time spent in loading Surfaces from the disk cache and the number loaded and saved. Hits and
+# misses, the times, the effects and the disk cache counts are only collected while COLLECT_STATS
+# is set.
+@_locked
+def getstats():
+	stats = { name: cache.stats() for name, cache in _caches.items() }
+	stats.update(_stats)
+	stats["scratch_bytes"] = sum(_surfbytes(surf) for surf in _scratch.values())
+	return stats
+
+@_locked
+def resetstats():
+	for cache in _caches.values():
+		cache.hits = cache.misses = cache.evictions = 0
+	_stats.update(render_time = 0.0, render_count = 0, wrap_time = 0.0, wrap_count = 0,
+		effects_count = 0, effects_peak_bytes = 0, disk_time = 0.0, disk_loads = 0, disk_saves = 0)
+
+resetstats()
+
+def _fontrender(font, *args):
+	if not COLLECT_STATS:
+		return font.render(*args)
+	start = perf_counter()
+	surf = font.render(*args)
+	_stats["render_time"] += perf_counter() - start
+	_stats["render_count"] += 1
+	return surf
+
+# The memory actually used by a Surface's pixels.
+def _surfbytes(surf):
+	return surf.get_pitch() * surf.get_height()
 
 # Options objects encapsulate the keyword arguments to functions that take a lot of keyword
 # arguments.
 
 # Options object base class. Subclass for Options objects specific to different functions.
 # Specify valid fields in the _fields list. Unspecified fields default to None, unless otherwise
-# specified in the _defaults list.
+# specified in the _defaults list. Subclasses are decorated with _optionsclass, which precomputes
+# the field ordering and getters used below, and list their fields in __slots__.
 class _Options(object):
+	__slots__ = ()
 	_fields = ()
 	_defaults = {}
 	def __init__(self, **kwargs):
-		fields = self._allfields()
-		badfields = set(kwargs) - fields
-		if badfields:
-			raise ValueError("Unrecognized args: " + ", ".join(badfields))
-		for field in fields:
-			value = kwargs[field] if field in kwargs else self._defaults.get(field)
-			setattr(self, field, value)
+		fields = self._fieldset
+		if not fields.issuperset(kwargs):
+			raise ValueError("Unrecognized args: " + ", ".join(set(kwargs) - fields))
+		for field, default in self._initial:
+			setattr(self, field, kwargs.get(field, default))
 	def copy(self):
-		return self.__class__(**{ field: getattr(self, field) for field in self._allfields() })
+		new = object.__new__(self.__class__)
+		for field, value in zip(self._slotorder, self._slotgetter(self)):
+			setattr(new, field, value)
+		return new
 	@classmethod
 	def _allfields(cls):
-		return set(cls._fields) | set(cls._defaults)
+		return cls._fieldset
 	def keys(self):
-		return self._allfields()
+		return self._fieldset
 	def __getitem__(self, field):
 		return getattr(self, field)
 	def update(self, **newkwargs):
-		kwargs = { field: getattr(self, field) for field in self._allfields() }
+		kwargs = dict(zip(self._fieldorder, self._getter(self)))
 		kwargs.update(**newkwargs)
 		return self.__class__(**kwargs)
+	# The values of all fields in sorted field order. Dicts (i.e. colortag) are made hashable.
 	def key(self):
-		values = []
-		for field in sorted(self._allfields()):
-			value = getattr(self, field)
-			if isinstance(value, dict):
-				value = tuple(sorted(value.items()))
-			values.append(value)
-		return tuple(values)
+		values = self._getter(self)
+		if self._dictfields:
+			values = list(values)
+			for j in self._dictfields:
+				if isinstance(values[j], dict):
+					values[j] = tuple(sorted(values[j].items()))
+			values = tuple(values)
+		return values
 	def getsuboptions(self, optclass):
-		return { field: getattr(self, field) for field in optclass._allfields() if hasattr(self, field) }
+		subkey = self.__class__, optclass
+		if subkey not in _suboptions:
+			fields = tuple(field for field in optclass._fieldorder if field in self._fieldset)
+			_suboptions[subkey] = fields, _attrgetter(fields)
+		fields, getter = _suboptions[subkey]
+		return dict(zip(fields, getter(self)))
+
+_suboptions = {}
+
+# Resolved options are memoized by the keyword arguments they were resolved from, so that repeated
+# calls with the same arguments skip option resolution. Arguments that are not hashable (e.g.
+# colors given as lists) are resolved every time. Memoized options must not be modified. The
+# DEFAULT_ settings are applied when options are resolved, so after changing them while drawing,
+# clear _getsurf_options_cache and _draw_options_cache.
+def _memoizedoptions(cache, kwargs, resolve):
+	try:
+		key = frozenset(kwargs.items())
+		if key in cache:
+			return cache[key]
+	except TypeError:
+		return resolve(kwargs)
+	if len(cache) >= OPTIONS_CACHE_SIZE:
+		cache.clear()
+	cache[key] = value = resolve(kwargs)
+	return value
+
+# Always returns a tuple, also for a single field.
+def _attrgetter(fields):
+	getter = attrgetter(*fields) if fields else (lambda obj: ())
+	return getter if len(fields) != 1 else (lambda obj: (getter(obj),))
+
+def _optionsclass(cls):
+	cls._fieldset = frozenset(cls._fields) | frozenset(cls._defaults)
+	cls._fieldorder = tuple(sorted(cls._fieldset))
+	cls._initial = tuple((field, cls._defaults.get(field)) for field in cls._fieldorder)
+	cls._getter = _attrgetter(cls._fieldorder)
+	cls._dictfields = tuple(j for j, field in enumerate(cls._fieldorder) if field == "colortag")
+	slots = []
+	for klass in cls.__mro__:
+		slots.extend(slot for slot in getattr(klass, "__slots__", ()) if slot not in slots)
+	cls._slotorder = tuple(slots)
+	cls._slotgetter = _attrgetter(cls._slotorder)
+	return cls
 
 
 _default_sentinel = ()
 
 # Options argument for the draw function. Specifies both text styling and positioning.
+@_optionsclass
 class _DrawOptions(_Options):
 	_fields = ("pos",
 		"fontname", "fontsize", "sysfontname", "antialias", "bold", "italic", "underline",
@@ -103,6 +296,7 @@ class _DrawOptions(_Options):
 		"italictag": _default_sentinel,
 		"colortag": _default_sentinel,
 		"surf": _default_sentinel, "cache": True }
+	__slots__ = _fields
 
 	def __init__(self, **kwargs):
 		_Options.__init__(self, **kwargs)
@@ -156,7 +350,9 @@ class _DrawOptions(_Options):
 
 # Options for the layout function. By design, this has the same options as draw, although some of
 # them are silently ignored.
+@_optionsclass
 class _LayoutOptions(_DrawOptions):
+	__slots__ = ()
 	def __init__(self, **kwargs):
 		_Options.__init__(self, **kwargs)
 		self.expandposition()
@@ -183,6 +379,7 @@ class _LayoutOptions(_DrawOptions):
 		return self.getsuboptions(_GetfontOptions)
 
 
+@_optionsclass
 class _DrawboxOptions(_Options):
 	_fields = (
 		"fontname", "sysfontname", "antialias", "bold", "italic", "underline",
@@ -193,6 +390,7 @@ class _DrawboxOptions(_Options):
 	_defaults = {
 		"antialias": True, "alpha": 1.0, "angle": 0, "anchor": (0.5, 0.5),
 		"surf": _default_sentinel, "cache": True }
+	__slots__ = _fields
 	def __init__(self, **kwargs):
 		_Options.__init__(self, **kwargs)
 		if self.fontname is None: self.fontname = DEFAULT_FONT_NAME
@@ -206,6 +404,7 @@ class _DrawboxOptions(_Options):
 		return self.getsuboptions(_FitsizeOptions)
 
 
+@_optionsclass
 class _GetsurfOptions(_Options):
 	_fields = ("fontname", "fontsize", "sysfontname", "bold", "italic", "underline", "width",
 		"widthem", "strip", "color", "background", "antialias", "ocolor", "owidth", "scolor",
@@ -218,6 +417,7 @@ class _GetsurfOptions(_Options):
 		"italictag": _default_sentinel,
 		"colortag": _default_sentinel,
 		"cache": True }
+	__slots__ = _fields + ("_opx", "_spx")
 
 	def __init__(self, **kwargs):
 		_Options.__init__(self, **kwargs)
@@ -267,6 +467,7 @@ class _GetsurfOptions(_Options):
 		return self.getsuboptions(_GetfontOptions)
 
 
+@_optionsclass
 class _WrapOptions(_Options):
 	_fields = ("fontname", "fontsize", "sysfontname",
 		"bold", "italic", "underline", "width", "widthem", "strip",
@@ -278,6 +479,7 @@ class _WrapOptions(_Options):
 		"italictag": _default_sentinel,
 		"colortag": _default_sentinel,
 	}
+	__slots__ = _fields
 
 	def __init__(self, **kwargs):
 		_Options.__init__(self, **kwargs)
@@ -295,8 +497,10 @@ class _WrapOptions(_Options):
 		return self.getsuboptions(_GetfontOptions)
 
 	
+@_optionsclass
 class _GetfontOptions(_Options):
 	_fields = ("fontname", "fontsize", "sysfontname", "bold", "italic", "underline")
+	__slots__ = _fields
 	def __init__(self, **kwargs):
 		_Options.__init__(self, **kwargs)
 		if self.fontname is not None and self.sysfontname is not None:
@@ -308,9 +512,11 @@ class _GetfontOptions(_Options):
 	def getfontpath(self):
 		return self.fontname if self.fontname is None else FONT_NAME_TEMPLATE % self.fontname
 
+@_optionsclass
 class _FitsizeOptions(_Options):
 	_fields = ("fontname", "sysfontname", "bold", "italic", "underline",
 		"lineheight", "pspace", "strip")
+	__slots__ = _fields
 
 	def togetfontoptions(self):
 		return self.getsuboptions(_GetfontOptions)
@@ -318,11 +524,16 @@ class _FitsizeOptions(_Options):
 	def towrapoptions(self):
 		return self.getsuboptions(_WrapOptions)
 
-_font_cache = {}
+_font_cache = _LRUCache("font", lambda: FONT_CACHE_SIZE)
+@_locked
 def getfont(**kwargs):
 	options = _GetfontOptions(**kwargs)
 	key = options.key()
-	if key in _font_cache: return _font_cache[key]
+	font = _font_cache.get(key)
+	if font is not None: return font
+	# The font module is initialized on first use rather than on import.
+	if not pygame.font.get_init():
+		pygame.font.init()
 	if options.sysfontname is not None:
 		font = pygame.font.SysFont(options.sysfontname, options.fontsize, options.bold or False, options.italic or False)
 	else:
@@ -354,11 +565,12 @@ def _binarysearch(f, xmin = 1, xmax = 256):
 			xmax = x
 	return xmin
 
-_fit_cache = {}
+_fit_cache = _LRUCache("fit", lambda: FIT_CACHE_SIZE)
 def _fitsize(text, size, **kwargs):
 	options = _FitsizeOptions(**kwargs)
 	key = text, size, options.key()
-	if key in _fit_cache: return _fit_cache[key]
+	fontsize = _fit_cache.get(key)
+	if fontsize is not None: return fontsize
 	width, height = size
 	def fits(fontsize):
 		opts = options.copy()
@@ -408,11 +620,12 @@ def _resolveangle(angle):
 	return int(round(angle / ANGLE_RESOLUTION_DEGREES)) * ANGLE_RESOLUTION_DEGREES
 
 # Return the set of points in the circle radius r, using Bresenham's circle algorithm
-_circle_cache = {}
+_circle_cache = _LRUCache("circle", lambda: CIRCLE_CACHE_SIZE)
 def _circlepoints(r):
 	r = int(round(r))
-	if r in _circle_cache:
-		return _circle_cache[r]
+	points = _circle_cache.get(r)
+	if points is not None:
+		return points
 	x, y, e = r, 0, 1 - r
 	_circle_cache[r] = points = []
 	while x >= y:
@@ -429,6 +642,145 @@ def _circlepoints(r):
 	points.sort()
 	return points
 
+# Surfaces reused between renders for the intermediate layers of effects, by name. Each is as large
+# as the largest layer it has held; a cleared subsurface of the requested size is returned.
+_scratch = {}
+def _getscratch(name, size):
+	w, h = size
+	buf = _scratch.get(name)
+	if buf is None or buf.get_width() < w or buf.get_height() < h:
+		bw, bh = buf.get_size() if buf is not None else (0, 0)
+		buf = _scratch[name] = pygame.Surface((max(w, bw), max(h, bh))).convert_alpha()
+	surf = buf.subsurface((0, 0, w, h))
+	surf.fill((0, 0, 0, 0))
+	return surf
+
+# Replace the color of every pixel, keeping the alpha.
+def _recolor(surf, color):
+	surf.fill((0, 0, 0), None, pygame.BLEND_RGB_MULT)
+	surf.fill(color[:3], None, pygame.BLEND_RGB_ADD)
+
+# Blit the outline of the silhouette, which is at (opx, opx) in the target, by blitting it at every
+# offset given by _circlepoints(opx).
+def _outlineblits(target, silhouette, opx):
+	for dx, dy in _circlepoints(opx):
+		target.blit(silhouette, (dx + opx, dy + opx))
+
+# Dilate the Surface in place by the segment of n points starting at offset 0 and stepping by
+# (dx, dy), taking the maximum of each channel. Doubling the covered length each time takes only
+# log2(n) blits.
+def _dilatesegment(surf, n, dx, dy):
+	copy = _getscratch("dilatecopy", surf.get_size())
+	covered = 1
+	while covered < n:
+		step = min(covered, n - covered)
+		# The Surface only grows, so no need to clear the copy.
+		copy.blit(surf, (0, 0), None, pygame.BLEND_RGBA_MAX)
+		surf.blit(copy, (step * dx, step * dy), None, pygame.BLEND_RGBA_MAX)
+		covered += step
+
+# The same as _outlineblits, as a dilation by an octagon of radius opx, built as the sum of a
+# horizontal, a vertical and two diagonal segments. This takes O(log opx) blits rather than the
+# O(opx) blits of _outlineblits. The alpha at antialiased edges is the maximum of the covering
+# pixels instead of their composite, which is slightly softer, and the octagon misses the pixels of
+# the disc near its corners. Under 3% of the pixels of outlined text differ by more than half their
+# alpha from _outlineblits (tests/test_ptext.py).
+def _outlinedilate(target, silhouette, opx):
+	# Diagonal segments of length b and straight ones of length a span opx both straight along the
+	# axes (a + 2b) and diagonally (sqrt(2) * (a + b)).
+	b = int(round(opx * (1 - 0.5 ** 0.5)))
+	a = opx - 2 * b
+	w0, h0 = silhouette.get_size()
+	# Extra padding of opx on every side, since the source starts at the corner of the octagon.
+	work = _getscratch("dilate", (w0 + 4 * opx, h0 + 4 * opx))
+	work.blit(silhouette, (2 * opx - a - 2 * b, 2 * opx - a), None, pygame.BLEND_RGBA_MAX)
+	_dilatesegment(work, 2 * a + 1, 1, 0)
+	_dilatesegment(work, 2 * a + 1, 0, 1)
+	_dilatesegment(work, 2 * b + 1, 1, 1)
+	_dilatesegment(work, 2 * b + 1, 1, -1)
+	target.blit(work, (-opx, -opx))
+
+# Effects are composed in a single pass. The plain text is rendered once as the base, with a
+# transparent background, and cached like any other Surface, so that it is shared by every
+# combination of effects. The layers (background, drop shadow, outline and text) are then blitted
+# onto one canvas, which is faded and rotated in place. Only the base, the base on its background
+# for an outline without a shadow, and the final Surface are cached; the intermediate layers live
+# in scratch Surfaces. The layers are stacked as the separate stages used to: the drop shadow is
+# the text in scolor with its outline in ocolor.
+def _baseoptions(options):
+	color = (0, 0, 0) if _istransparent(options.color) else options.color
+	return options.update(angle = 0, alpha = 1.0, shadow = None, scolor = None, owidth = None,
+		ocolor = None, background = (0, 0, 0, 0), color = color)
+
+# The unrotated size of the text with effects, given the size of its base.
+def _effectsize(basesize, options):
+	w0, h0 = basesize
+	opx = options._opx or 0
+	sx, sy = options._spx or (0, 0)
+	return w0 + 2 * opx + abs(sx), h0 + 2 * opx + abs(sy)
+
+def _rendereffects(text, options):
+	base = _getsurf(text, _baseoptions(options))
+	w0, h0 = base.get_size()
+	size = _effectsize((w0, h0), options)
+	opx = options._opx or 0
+	sx, sy = options._spx or (0, 0)
+	# The canvas is only kept when it is the final Surface.
+	canvas = _getscratch("canvas", size) if options.angle else pygame.Surface(size).convert_alpha()
+	canvas.fill(options.background or (0, 0, 0, 0))
+	layers = [base, canvas]
+	outline = None
+	if options._opx is not None:
+		silhouette = _getscratch("silhouette", (w0, h0))
+		silhouette.blit(base, (0, 0), None, pygame.BLEND_RGBA_MAX)
+		_recolor(silhouette, options.ocolor)
+		outline = _getscratch("outline", (w0 + 2 * opx, h0 + 2 * opx))
+		if opx >= OUTLINE_DILATE_MIN_PX:
+			_outlinedilate(outline, silhouette, opx)
+			layers += [_scratch["dilate"], _scratch["dilatecopy"]]
+		else:
+			_outlineblits(outline, silhouette, opx)
+		layers += [silhouette, outline]
+	# The shadow is offset by (sx, sy) from the outlined text, which is at (x0, y0).
+	dx, dy = max(sx, 0), max(sy, 0)
+	x0, y0 = abs(sx) - dx, abs(sy) - dy
+	if options._spx is not None:
+		# The shadow is the text in scolor over its outline, which keeps ocolor.
+		shadowtext = _getscratch("shadowtext", (w0, h0))
+		shadowtext.blit(base, (0, 0), None, pygame.BLEND_RGBA_MAX)
+		_recolor(shadowtext, options.scolor)
+		shadow = _getscratch("shadow", (w0 + 2 * opx, h0 + 2 * opx))
+		if outline is not None:
+			shadow.blit(outline, (0, 0), None, pygame.BLEND_RGBA_MAX)
+		shadow.blit(shadowtext, (opx, opx))
+		canvas.blit(shadow, (dx, dy))
+		layers += [shadowtext, shadow]
+	if outline is not None:
+		canvas.blit(outline, (x0, y0))
+	# Without a shadow the text goes on top of the outline rendered on its background, which hides the
+	# outline inside the text box.
+	if outline is not None and options._spx is None and options.background and not _istransparent(options.color):
+		boxed = _getsurf(text, _baseoptions(options).update(background = options.background))
+		canvas.blit(boxed, (x0 + opx, y0 + opx))
+		layers.append(boxed)
+	elif _istransparent(options.color):
+		canvas.blit(base, (x0 + opx, y0 + opx), None, pygame.BLEND_RGBA_SUB)
+	else:
+		canvas.blit(base, (x0 + opx, y0 + opx))
+	if options.alpha < 1.0:
+		canvas.fill((255, 255, 255, int(round(255 * options.alpha))), None, pygame.BLEND_RGBA_MULT)
+	surf = canvas
+	if options.angle:
+		surf = _rotatesurf(canvas, options.angle)
+		_unrotated_size[(surf.get_size(), options.angle, text)] = size
+		layers.append(surf)
+	if COLLECT_STATS:
+		# Every layer is alive until the end of the render, so their total is the peak.
+		peak = sum(_surfbytes(layer) for layer in layers)
+		_stats["effects_count"] += 1
+		_stats["effects_peak_bytes"] = max(_stats["effects_peak_bytes"], peak)
+	return surf
+
 # Rotate the given surface by the given angle, in degrees.
 # If angle is an exact multiple of 90, use pygame.transform.rotate, otherwise fall back to
 # pygame.transform.rotozoom.
@@ -438,35 +790,43 @@ def _rotatesurf(surf, angle):
 	else:
 		return pygame.transform.rotozoom(surf, angle, 1.0)
 
-# Apply the given alpha value to a copy of the Surface.
-def _fadesurf(surf, alpha):
-	surf = surf.copy()
-	asurf = surf.copy()
-	asurf.fill((255, 255, 255, int(round(255 * alpha))))
-	surf.blit(asurf, (0, 0), None, pygame.BLEND_RGBA_MULT)
-	return surf
-
 def _istransparent(color):
 	return len(color) > 3 and color[3] == 0
 
 # Produce a 1xh Surface with the given color gradient.
-_grad_cache = {}
-def _gradsurf(h, y0, y1, color0, color1):
-	key = h, y0, y1, color0, color1
-	if key in _grad_cache:
-		return _grad_cache[key]
+_grad_cache = _LRUCache("grad", lambda: GRAD_CACHE_MB * (1 << 20), _surfbytes)
+# A transparent Surface of the given size with a vertical gradient from color0 at y0 to color1 at y1,
+# to be added to text rendered in black. The gradient is computed as a single column and stretched
+# to the width, and the result is cached, so each span size is only built once.
+def _gradsurf(size, y0, y1, color0, color1):
+	key = size, y0, y1, color0, color1
+	surf = _grad_cache.get(key)
+	if surf is not None:
+		return surf
+	w, h = size
 	surf = pygame.Surface((1, h)).convert_alpha()
-	r0, g0, b0 = color0[:3]
-	r1, g1, b1 = color1[:3]
-	for y in range(h):
-		f = min(max((y - y0) / (y1 - y0), 0), 1)
-		g = 1 - f
-		surf.set_at((0, y), (
-			int(round(g * r0 + f * r1)),
-			int(round(g * g0 + f * g1)),
-			int(round(g * b0 + f * b1)),
-			0
-		))
+	if _importnumpy() is not None:
+		f = numpy.clip((numpy.arange(h) - y0) / (y1 - y0), 0, 1)[:, None]
+		pixels = pygame.surfarray.pixels3d(surf)
+		pixels[0] = numpy.rint((1 - f) * color0[:3] + f * color1[:3])
+		del pixels
+		alpha = pygame.surfarray.pixels_alpha(surf)
+		alpha[...] = 0
+		del alpha
+	else:
+		r0, g0, b0 = color0[:3]
+		r1, g1, b1 = color1[:3]
+		for y in range(h):
+			f = min(max((y - y0) / (y1 - y0), 0), 1)
+			g = 1 - f
+			surf.set_at((0, y), (
+				int(round(g * r0 + f * r1)),
+				int(round(g * g0 + f * g1)),
+				int(round(g * b0 + f * b1)),
+				0
+			))
+	if w != 1:
+		surf = pygame.transform.scale(surf, size)
 	_grad_cache[key] = surf
 	return surf
 
@@ -534,35 +894,63 @@ def _splitbytags(text, tagspec0, color0, underlinetag, boldtag, italictag, color
 # A valid breakpoint is one such that getwidth(text[:a]) is not greater than width. Exception: the
 # first breakpoint in a line is always valid.
 # This function returns the index of the last valid breakpoint.
+# Widths are assumed to grow with the length of the prefix, so the breakpoints are searched by
+# doubling the step until an invalid one is found, and then by bisection. This measures O(log n)
+# prefixes no longer than about twice the line, instead of every prefix up to the end of the text.
 def _getbreakpoint(text, width, getwidth, canbreakatstart = False):
 	def isvalid(breakpoint):
 		return getwidth(text[:breakpoint]) <= width
-	# At any point, a is the index of a known valid break point. b is a candidate breakpoint, and c
-	# is the rightmost breakpoint.
+	# a is the index of a known valid break point, and c is the rightmost breakpoint.
 	c = len(text.rstrip(" "))
-	if width is None or isvalid(c):
+	if width is None:
 		return c
 	if canbreakatstart:
 		a = 0
 	else:
 		# Preserve leading spaces.
 		lspaces = len(text) - len(text.lstrip(" "))
-		a = text.index(" ", lspaces) if " " in text[lspaces:] else len(text)
+		a = text.find(" ", lspaces)
+		if a == -1:
+			a = len(text)
 	# Only one breakpoint, automatically valid as an exception.
-	if a == c:
-		return a
-	# TODO: binary search
-	while True:
-		subtext = text[a:c]
-		# The next breakpoint must occur after any leading spaces.
-		sublspaces = len(subtext) - len(subtext.lstrip(" "))
-		if " " not in subtext[sublspaces:]:
-			return a
-		b = a + subtext.index(" ", sublspaces + 1)
-		if isvalid(b):
-			a = b
+	if a >= c:
+		return c if a > c and isvalid(c) else a
+	# The breakpoints after a and before c, found as needed.
+	breakpoints = []
+	def findbreakpoints(n):
+		while len(breakpoints) < n:
+			# The next breakpoint must occur after any leading spaces.
+			j = breakpoints[-1] if breakpoints else a
+			while j < c and text[j] == " ":
+				j += 1
+			b = text.find(" ", j + 1, c)
+			if b == -1:
+				return False
+			breakpoints.append(b)
+		return True
+	# lo is the index of the last breakpoint known to be valid (-1 for a), hi the index of the first
+	# one known to be invalid.
+	lo, hi, step = -1, None, 1
+	while hi is None:
+		k = lo + step
+		if not findbreakpoints(k + 1):
+			k = len(breakpoints) - 1
+			if k == lo:
+				# Every breakpoint before c is valid.
+				if isvalid(c):
+					return c
+				return breakpoints[lo] if lo >= 0 else a
+		if isvalid(breakpoints[k]):
+			lo, step = k, 2 * step
+		else:
+			hi = k
+	while hi - lo > 1:
+		mid = (lo + hi) // 2
+		if isvalid(breakpoints[mid]):
+			lo = mid
 		else:
-			return a
+			hi = mid
+	return breakpoints[lo] if lo >= 0 else a
 
 # Split a single line of text.
 # textandtags is the output of _splitbytags, i.e. a sequence of (string, tag spec) tuples.
@@ -593,6 +981,15 @@ def _wrapline(textandtags, width, getwidthbytagspec):
 	return lines
 
 def _wrap(text, **kwargs):
+	if not COLLECT_STATS:
+		return _wrapspans(text, **kwargs)
+	start = perf_counter()
+	spans = _wrapspans(text, **kwargs)
+	_stats["wrap_time"] += perf_counter() - start
+	_stats["wrap_count"] += 1
+	return spans
+
+def _wrapspans(text, **kwargs):
 	options = _WrapOptions(**kwargs)
 	# Returns a function mapping strings to int widths in the specified font
 	opts = options.copy()
@@ -633,71 +1030,144 @@ def _wrap(text, **kwargs):
 
 			
 
-_surf_cache = {}
-_surf_tick_usage = {}
-_surf_size_total = 0
-_unrotated_size = {}
-_tick = 0
+# The Surface cache is measured in bytes and is only shrunk by clean().
+_surf_cache = _LRUCache("surf", sizeof=_surfbytes)
+
+# Disk cache. Each Surface is a file named by a hash of the text, the options, the settings that
+# change the rendering and the contents of the font file, so that changing any of them makes a new
+# entry rather than loading a stale one. The file is a header and the raw RGBA pixels, which are
+# memory-mapped when loaded. Files are written to a temporary name and renamed, so that a crash
+# never leaves a partial entry. Failing to read or write the cache is not an error.
+_DISK_MAGIC = b"ptxt"
+# Magic, width, height, and the unrotated width and height for rotated Surfaces.
+_DISK_HEADER = struct.Struct("<4s4I")
+
+# The hash of each font file, and of the font file of each font by name, style and system font
+# name. A font file is only hashed once per run; it's already loaded by then anyway.
+_font_hashes = {}
+_font_file_hashes = {}
+def _fonthash(options):
+	key = options.fontname, options.sysfontname, options.bold, options.italic
+	fonthash = _font_hashes.get(key)
+	if fonthash is not None:
+		return fonthash
+	fontoptions = _GetfontOptions(**options.togetfontoptions())
+	if fontoptions.sysfontname is not None:
+		path = pygame.font.match_font(fontoptions.sysfontname, fontoptions.bold or False, fontoptions.italic or False)
+	else:
+		path = fontoptions.getfontpath()
+	if path is None:
+		path = os.path.join(os.path.dirname(pygame.__file__), pygame.font.get_default_font())
+	fonthash = _font_file_hashes.get(path)
+	if fonthash is None:
+		with open(path, "rb") as f:
+			fonthash = _font_file_hashes[path] = hashlib.sha1(f.read()).hexdigest()
+	_font_hashes[key] = fonthash
+	return fonthash
+
+# Whether the Surface would be big enough to keep on disk, estimated from the number of characters,
+# so that small Surfaces skip the disk cache before anything is hashed or looked up. Loading and
+# saving use the same estimate, so a Surface is saved exactly when it will be looked for.
+def _diskcacheable(text, options):
+	pad = 2 * (options._opx or 0)
+	sx, sy = options._spx or (0, 0)
+	# Characters are about 0.6 em wide on average.
+	w = len(text) * options.fontsize * 0.6 + pad + abs(sx)
+	h = options.fontsize * options.lineheight + pad + abs(sy)
+	return 4 * w * h >= DISK_CACHE_MIN_KB * 1024
+
+def _diskpath(text, options):
+	try:
+		fonthash = _fonthash(options)
+	except OSError:
+		return None
+	settings = pygame.version.ver, OUTLINE_DILATE_MIN_PX, options._opx, options._spx
+	key = repr((fonthash, settings, text, options.key())).encode("utf-8")
+	return os.path.join(DISK_CACHE_DIR, hashlib.sha1(key).hexdigest() + ".rgba")
+
+def _diskload(path, text, options):
+	start = perf_counter()
+	try:
+		with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+			magic, w, h, uw, uh = _DISK_HEADER.unpack_from(data)
+			if magic != _DISK_MAGIC or len(data) != _DISK_HEADER.size + 4 * w * h:
+				return None
+			# The pixels are converted straight from the mapping, and no reference to it is kept.
+			view = memoryview(data)[_DISK_HEADER.size:]
+			raw = pygame.image.frombuffer(view, (w, h), "RGBA")
+			surf = raw.convert_alpha()
+			del raw
+			view.release()
+	except (OSError, ValueError, struct.error):
+		return None
+	if options.angle:
+		_unrotated_size[(surf.get_size(), options.angle, text)] = uw, uh
+	if COLLECT_STATS:
+		_stats["disk_time"] += perf_counter() - start
+		_stats["disk_loads"] += 1
+	return surf
+
+def _disksave(path, surf, text, options):
+	w, h = surf.get_size()
+	uw, uh = _unrotated_size.get((surf.get_size(), options.angle, text), (0, 0)) if options.angle else (0, 0)
+	tmppath = None
+	try:
+		os.makedirs(DISK_CACHE_DIR, exist_ok = True)
+		fd, tmppath = tempfile.mkstemp(suffix = ".tmp", dir = DISK_CACHE_DIR)
+		with os.fdopen(fd, "wb") as f:
+			f.write(_DISK_HEADER.pack(_DISK_MAGIC, w, h, uw, uh))
+			f.write(pygame.image.tobytes(surf, "RGBA"))
+		os.replace(tmppath, path)
+	except OSError:
+		if tmppath is not None and os.path.exists(tmppath):
+			os.remove(tmppath)
+		return
+	if COLLECT_STATS:
+		_stats["disk_saves"] += 1
+
+# Remove every entry from the disk cache, e.g. to reclaim the space taken by stale ones.
+@_locked
+def cleardiskcache():
+	if DISK_CACHE_DIR is None or not os.path.isdir(DISK_CACHE_DIR):
+		return
+	for name in os.listdir(DISK_CACHE_DIR):
+		if name.endswith(".rgba") or name.endswith(".tmp"):
+			os.remove(os.path.join(DISK_CACHE_DIR, name))
+_unrotated_size = _LRUCache("unrotated", lambda: UNROTATED_CACHE_SIZE)
+_getsurf_options_cache = {}
+def _resolvegetsurfoptions(kwargs):
+	return _GetsurfOptions(**kwargs)
+
+@_locked
 def getsurf(text, **kwargs):
-	global _tick, _surf_size_total
-	options = _GetsurfOptions(**kwargs)
+	return _getsurf(text, _memoizedoptions(_getsurf_options_cache, kwargs, _resolvegetsurfoptions))
+
+def _getsurf(text, options):
 	key = text, options.key()
-	if key in _surf_cache:
-		_surf_tick_usage[key] = _tick
-		_tick += 1
-		return _surf_cache[key]
+	surf = _surf_cache.get(key)
+	if surf is not None:
+		# The unrotated size may have been evicted separately.
+		if options.angle and (surf.get_size(), options.angle, text) not in _unrotated_size:
+			base = _getsurf(text, _baseoptions(options))
+			_unrotated_size[(surf.get_size(), options.angle, text)] = _effectsize(base.get_size(), options)
+		return surf
+
+	path = None
+	if options.cache and DISK_CACHE_DIR is not None and _diskcacheable(text, options):
+		path = _diskpath(text, options)
+	if path is not None:
+		surf = _diskload(path, text, options)
+	if surf is None:
+		surf = _rendersurf(text, options)
+		if path is not None:
+			_disksave(path, surf, text, options)
+	if options.cache:
+		_surf_cache[key] = surf
+	return surf
 
-	if options.angle:
-		surf0 = getsurf(text, **options.update(angle = 0))
-		surf = _rotatesurf(surf0, options.angle)
-		_unrotated_size[(surf.get_size(), options.angle, text)] = surf0.get_size()
-	elif options.alpha < 1.0:
-		surf = _fadesurf(getsurf(text, **options.update(alpha = 1.0)), options.alpha)
-	elif options._spx is not None:
-		color = (0, 0, 0) if _istransparent(options.color) else options.color
-		surf0 = getsurf(text, **options.update(background = (0, 0, 0, 0), color = color, shadow = None, scolor = None))
-		sopts = {
-			"color": options.scolor,
-			"shadow": None,
-			"scolor": None,
-			"background": (0, 0, 0, 0),
-			"gcolor": None,
-			"colortag": { k: None for k in options.colortag },
-		}
-		ssurf = getsurf(text, **options.update(**sopts))
-		w0, h0 = surf0.get_size()
-		sx, sy = options._spx
-		surf = pygame.Surface((w0 + abs(sx), h0 + abs(sy))).convert_alpha()
-		surf.fill(options.background or (0, 0, 0, 0))
-		dx, dy = max(sx, 0), max(sy, 0)
-		surf.blit(ssurf, (dx, dy))
-		x0, y0 = abs(sx) - dx, abs(sy) - dy
-		if _istransparent(options.color):
-			surf.blit(surf0, (x0, y0), None, pygame.BLEND_RGBA_SUB)
-		else:
-			surf.blit(surf0, (x0, y0))
-	elif options._opx is not None:
-		color = (0, 0, 0) if _istransparent(options.color) else options.color
-		surf0 = getsurf(text, **options.update(color = color, ocolor = None, owidth = None))
-		oopts = {
-			"color": options.ocolor,
-			"ocolor": None,
-			"owidth": None,
-			"background": (0, 0, 0, 0),
-			"gcolor": None,
-			"colortag": { k: None for k in options.colortag },
-		}
-		osurf = getsurf(text, **options.update(**oopts))
-		w0, h0 = surf0.get_size()
-		opx = options._opx
-		surf = pygame.Surface((w0 + 2 * opx, h0 + 2 * opx)).convert_alpha()
-		surf.fill(options.background or (0, 0, 0, 0))
-		for dx, dy in _circlepoints(opx):
-			surf.blit(osurf, (dx + opx, dy + opx))
-		if _istransparent(options.color):
-			surf.blit(surf0, (opx, opx), None, pygame.BLEND_RGBA_SUB)
-		else:
-			surf.blit(surf0, (opx, opx))
+def _rendersurf(text, options):
+	if options.angle or options.alpha < 1.0 or options._spx is not None or options._opx is not None:
+		surf = _rendereffects(text, options)
 	else:
 		# A span is a section of text with a consistent styling within a single line. Each span is
 		# rendered separately into a Surface, and then the different spans' Surfaces are blitted
@@ -715,11 +1185,10 @@ def getsurf(text, **kwargs):
 				args = tpiece, opts.antialias, color
 				if opts.background is not None and not _istransparent(opts.background):
 					args += (opts.background,)
-				spansurf = font.render(*args).convert_alpha()
+				spansurf = _fontrender(font, *args).convert_alpha()
 			else:
-				spansurf = font.render(tpiece, opts.antialias, (0, 0, 0)).convert_alpha()
-				gsurf0 = _gradsurf(spansurf.get_height(), 0.5 * font.get_ascent(), font.get_ascent(), opts.color, opts.gcolor)
-				gsurf = pygame.transform.scale(gsurf0, spansurf.get_size())
+				spansurf = _fontrender(font, tpiece, opts.antialias, (0, 0, 0)).convert_alpha()
+				gsurf = _gradsurf(spansurf.get_size(), 0.5 * font.get_ascent(), font.get_ascent(), opts.color, opts.gcolor)
 				spansurf.blit(gsurf, (0, 0), None, pygame.BLEND_RGBA_ADD)
 			spansurfs.append(spansurf)
 		# Now to blit the span Surfaces together onto a single Surface. As an optimization, when
@@ -738,12 +1207,6 @@ def getsurf(text, **kwargs):
 			for (_, _, x0, _, _, linewidth), spansurf, y in zip(spans, spansurfs, ys):
 				x = int(round(x0 + opts.align * (w - linewidth)))
 				surf.blit(spansurf, (x, y))
-	if options.cache:
-		w, h = surf.get_size()
-		_surf_size_total += 4 * w * h
-		_surf_cache[key] = surf
-		_surf_tick_usage[key] = _tick
-		_tick += 1
 	return surf
 
 
@@ -768,6 +1231,7 @@ def _blitpos(angle, pos, anchor, size, text):
 	return x, y
 
 
+@_locked
 def layout(text, **kwargs):
 	options = _LayoutOptions(**kwargs)
 	if options.angle != 0:
@@ -807,16 +1271,173 @@ def layout(text, **kwargs):
 	return [(text, rect, font) for (text, _, _, _, _, _), rect, font in zip(spans, rects, fonts)]
 
 
+_draw_options_cache = {}
+def _resolvedrawoptions(kwargs):
+	options = _DrawOptions(**kwargs)
+	return options, _GetsurfOptions(**options.togetsurfoptions())
+
+@_locked
 def draw(text, pos=None, **kwargs):
-	options = _DrawOptions(pos = pos, **kwargs)
-	tsurf = getsurf(text, **options.togetsurfoptions())
+	kwargs["pos"] = pos
+	options, surfoptions = _memoizedoptions(_draw_options_cache, kwargs, _resolvedrawoptions)
+	tsurf = _getsurf(text, surfoptions)
 	pos = _blitpos(options.angle, options.pos, options.anchor, tsurf.get_size(), text)
-	if options.surf is not None:
-		options.surf.blit(tsurf, pos)
+	# The display Surface is looked up on every call, since it changes when the display mode does.
+	surf = options.surf if "surf" in kwargs else pygame.display.get_surface()
+	if surf is not None:
+		surf.blit(tsurf, pos)
 	if AUTO_CLEAN:
 		clean()
 	return tsurf, pos
 
+# Glyph atlas: every glyph is rendered once for a given font, size and color, and strings are
+# composed by blitting the cached glyphs. pygame.font does not expose kerning, so the advance of
+# each pair of characters is measured from the width of the pair instead.
+class _GlyphAtlas(object):
+	def __init__(self, font, color, antialias):
+		self.font = font
+		self.color = color
+		self.antialias = antialias
+		self.glyphs = {}
+		self.widths = {}
+		self.advances = {}
+
+	def glyph(self, char):
+		if char not in self.glyphs:
+			self.glyphs[char] = _fontrender(self.font, char, self.antialias, self.color).convert_alpha()
+		return self.glyphs[char]
+
+	def charwidth(self, char):
+		if char not in self.widths:
+			self.widths[char] = self.font.size(char)[0]
+		return self.widths[char]
+
+	def advance(self, char, nextchar):
+		pair = char + nextchar
+		if pair not in self.advances:
+			self.advances[pair] = self.font.size(pair)[0] - self.charwidth(nextchar)
+		return self.advances[pair]
+
+	# Measuring the whole line does not rasterize anything, and avoids rounding errors adding up.
+	def width(self, line):
+		return self.font.size(line)[0]
+
+	def blitline(self, surf, line, x, y):
+		blits = []
+		for char, nextchar in zip(line, line[1:] + " "):
+			blits.append((self.glyph(char), (x, y)))
+			x += self.advance(char, nextchar)
+		surf.blits(blits, False)
+
+_glyph_atlases = _LRUCache("glyphatlas", lambda: GLYPH_ATLAS_CACHE_SIZE)
+def _getglyphatlas(options):
+	if (options.width is not None or options.widthem is not None or options._opx is not None
+		or options._spx is not None or options.gcolor or options.alpha < 1.0 or options.angle
+		or options.underlinetag or options.boldtag or options.italictag or options.colortag):
+		raise ValueError("Glyph rendering not compatible with wrapping, outline, drop shadow, gradient, transparency, rotation, or tags.")
+	key = _GetfontOptions(**options.togetfontoptions()).key(), options.color, options.antialias
+	atlas = _glyph_atlases.get(key)
+	if atlas is None:
+		font = getfont(**options.togetfontoptions())
+		_glyph_atlases[key] = atlas = _GlyphAtlas(font, options.color, options.antialias)
+	return atlas
+
+# Retained text object. The options are resolved, and the Surface and its blit position computed,
+# only when the text or the options change. Drawing an unchanged Text is a single blit.
+#   score = ptext.Text("", topleft=(5, 5), fontsize=18)
+#   score.text = "SCORE: %d" % points  # No-op if the text is the same
+#   score.draw()
+# Options are the same as for draw. With glyphs=True the text is composed from a glyph atlas
+# instead of being rendered with the font, which suits counters and other text that changes every
+# frame: new strings cost no font rasterization and do not go into the Surface cache.
+class Text(object):
+	def __init__(self, text, pos=None, glyphs=False, **kwargs):
+		self._text = text
+		self._kwargs = dict(kwargs, pos=pos)
+		self._glyphs = glyphs
+		self._buffer = None
+		self._options = None
+		self._surfoptions = None
+		self._atlas = None
+		self._tsurf = None
+		self._pos = None
+		self._surf = None
+
+	@property
+	def text(self):
+		return self._text
+
+	@text.setter
+	def text(self, text):
+		if text != self._text:
+			self._text = text
+			self._tsurf = None
+
+	# Update any of the draw options. Only values that actually change invalidate the Surface.
+	def set(self, **kwargs):
+		for field, value in kwargs.items():
+			if field not in self._kwargs or self._kwargs[field] != value:
+				self._kwargs[field] = value
+				self._options = None
+				self._tsurf = None
+
+	def render(self):
+		if self._tsurf is None:
+			self._render()
+		return self._tsurf, self._pos
+
+	# Only rendering takes the lock, so that drawing an unchanged Text never waits for the prewarm
+	# worker.
+	@_locked
+	def _render(self):
+		if self._options is None:
+			self._options = _DrawOptions(**self._kwargs)
+			self._surfoptions = _GetsurfOptions(**self._options.togetsurfoptions())
+			if self._glyphs:
+				self._atlas = _getglyphatlas(self._surfoptions)
+		options = self._options
+		if self._glyphs:
+			self._tsurf = self._composeglyphs(self._atlas, self._surfoptions)
+		else:
+			self._tsurf = _getsurf(self._text, self._surfoptions)
+			if AUTO_CLEAN:
+				clean()
+		self._pos = _blitpos(options.angle, options.pos, options.anchor, self._tsurf.get_size(), self._text)
+		self._surf = options.surf
+
+	# The glyphs are blitted into a buffer that is kept between renders. A new subsurface of it is
+	# returned each time, so that the result never compares equal to the previous one.
+	def _composeglyphs(self, atlas, options):
+		lines = self._text.split("\n")
+		if options.strip:
+			lines = [line.rstrip(" ") for line in lines]
+		widths = [atlas.width(line) for line in lines]
+		linesize = atlas.font.get_linesize() * (options.lineheight + options.pspace)
+		ys = [int(round(jline * linesize)) for jline in range(len(lines))]
+		# As with getsurf, a single line is as tall as the font renders it.
+		lineheight = atlas.font.get_height() if len(lines) > 1 else atlas.glyph(" ").get_height()
+		w, h = max(widths), ys[-1] + lineheight
+		if self._buffer is None or self._buffer.get_width() < w or self._buffer.get_height() < h:
+			bw, bh = self._buffer.get_size() if self._buffer is not None else (0, 0)
+			self._buffer = pygame.Surface((max(w, bw), max(h, bh))).convert_alpha()
+		surf = self._buffer.subsurface((0, 0, w, h))
+		surf.fill(options.background or (0, 0, 0, 0))
+		for line, linewidth, y in zip(lines, widths, ys):
+			atlas.blitline(surf, line, int(round(options.align * (w - linewidth))), y)
+		return surf
+
+	def draw(self):
+		tsurf, pos = self.render()
+		if self._surf is not None:
+			self._surf.blit(tsurf, pos)
+		return tsurf, pos
+
+	@property
+	def rect(self):
+		tsurf, pos = self.render()
+		return tsurf.get_rect(topleft=pos)
+
+@_locked
 def drawbox(text, rect, **kwargs):
 	options = _DrawboxOptions(**kwargs)
 	rect = pygame.Rect(rect)
@@ -826,18 +1447,68 @@ def drawbox(text, rect, **kwargs):
 	fontsize = _fitsize(text, rect.size, **options.tofitsizeoptions())
 	return draw(text, pos=(x,y), width=rect.width, fontsize=fontsize, **options.todrawoptions())
 
+@_locked
 def clean():
-	global _surf_size_total
 	memory_limit = MEMORY_LIMIT_MB * (1 << 20)
-	if _surf_size_total < memory_limit:
+	if _surf_cache.size < memory_limit:
 		return
-	memory_limit *= MEMORY_REDUCTION_FACTOR
-	keys = sorted(_surf_cache, key=_surf_tick_usage.get)
-	for key in keys:
-		w, h = _surf_cache[key].get_size()
-		del _surf_cache[key]
-		del _surf_tick_usage[key]
-		_surf_size_total -= 4 * w * h
-		if _surf_size_total < memory_limit:
-			break
-
+	_surf_cache.shrink(memory_limit * MEMORY_REDUCTION_FACTOR)
+
+# Render texts into the caches ahead of their first use, so that the frame that first draws them
+# does not pay for the rendering. Each item is a (text, options) pair, where options is a dict of
+# the keyword arguments the text will be drawn with (as for draw or Text; the position is
+# ignored), or a Text whose options are used. A Text on its own stands for its current text. Texts
+# drawn with glyphs=True have the glyphs of the text rendered into the glyph atlas instead.
+#   ptext.prewarm([("GAME OVER", dict(fontsize=60, owidth=1)), score_text])
+def prewarm(items):
+	for item in items:
+		_prewarmitem(item)
+
+@_locked
+def _prewarmitem(item):
+	if isinstance(item, Text):
+		item = item.text, item
+	text, options = item
+	if isinstance(options, Text):
+		kwargs, glyphs = dict(options._kwargs), options._glyphs
+	else:
+		kwargs = dict(options)
+		glyphs = kwargs.pop("glyphs", False)
+	# Resolved the way draw resolves them, since the anchor can set the alignment. The position
+	# might not be given, and doesn't change the Surface.
+	if kwargs.get("pos") is None:
+		kwargs["pos"] = 0, 0
+	surfoptions = _GetsurfOptions(**_DrawOptions(**kwargs).togetsurfoptions())
+	if glyphs:
+		atlas = _getglyphatlas(surfoptions)
+		for char in set(text) - set("\n"):
+			atlas.glyph(char)
+	else:
+		_getsurf(text, surfoptions)
+
+# The same as prewarm, in a background thread. Items are rendered in order, one at a time, so that
+# drawing in the meantime waits for at most one of them. Returns immediately.
+_prewarm_queue = None
+def prewarmasync(items):
+	global _prewarm_queue
+	if _prewarm_queue is None:
+		_prewarm_queue = queue.Queue()
+		threading.Thread(target=_prewarmworker, name="ptext-prewarm", daemon=True).start()
+	for item in items:
+		_prewarm_queue.put(item)
+
+# Block until every item queued by prewarmasync has been rendered.
+def prewarmwait():
+	if _prewarm_queue is not None:
+		_prewarm_queue.join()
+
+def _prewarmworker():
+	while True:
+		item = _prewarm_queue.get()
+		try:
+			_prewarmitem(item)
+		except Exception:
+			# A bad item must not stop the worker.
+			traceback.print_exc()
+		finally:
+			_prewarm_queue.task_done()
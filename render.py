@@ -0,0 +1,137 @@
+import pygame as pg
+
+BLIT = 0
+FILL = 1
+RECT = 2
+
+MAX_DIRTY_RECTS = 64
+
+
+# Dirty rectangle renderer. Drawing goes through keyed draw commands; each frame
+# the commands are compared with the ones of the previous frame under the same
+# key. Only the regions of commands that were added, removed or changed are
+# cleared, redrawn and pushed to the display.
+#
+# A command is considered unchanged if it draws the same Surface object (or
+# color) to the same place. Pass changed=True when a Surface was modified in
+# place.
+class DirtyRenderer:
+    def __init__(self, surface, background=(0, 0, 0)):
+        self.surface = surface
+        self.background = background
+        self.bounds = surface.get_rect()
+        self.commands = {}
+        self.previous = {}
+        self.changed = set()
+        self.damage = []
+        self.full = True
+        self.debug = False
+        self.pixels = 0
+
+    # Redraw the whole surface on the next frame
+    def invalidate(self):
+        self.full = True
+
+    def begin(self):
+        self.previous = self.commands
+        self.commands = {}
+        self.changed = set()
+
+    def blit(self, key, source, dest, area=None, special_flags=0, changed=False):
+        if area is not None:
+            area = pg.Rect(area)
+            rect = pg.Rect(dest[0], dest[1], area.width, area.height)
+        else:
+            rect = source.get_rect(topleft=(dest[0], dest[1]))
+        self.commands[key] = (BLIT, rect, source, area, special_flags)
+        if changed:
+            self.changed.add(key)
+        return rect
+
+    def fill(self, key, color, rect):
+        rect = pg.Rect(rect)
+        self.commands[key] = (FILL, rect, color)
+        return rect
+
+    def rect(self, key, color, rect, width=0):
+        rect = pg.Rect(rect)
+        self.commands[key] = (RECT, rect, color, width)
+        return rect
+
+    def dirty_rects(self):
+        if self.full:
+            self.full = False
+            return [self.bounds.copy()]
+        previous = self.previous
+        changed = self.changed
+        dirty = self.damage
+        self.damage = []
+        for key, command in self.commands.items():
+            old = previous.get(key)
+            if old != command or key in changed:
+                if old is not None:
+                    dirty.append(old[1])
+                dirty.append(command[1])
+        for key, old in previous.items():
+            if key not in self.commands:
+                dirty.append(old[1])
+        if len(dirty) > MAX_DIRTY_RECTS:
+            return [self.bounds.copy()]
+        return merge_rects(dirty, self.bounds)
+
+    def execute(self, command):
+        op = command[0]
+        if op == BLIT:
+            _, rect, source, area, special_flags = command
+            self.surface.blit(source, rect, area, special_flags)
+        elif op == FILL:
+            _, rect, color = command
+            self.surface.fill(color, rect)
+        else:
+            _, rect, color, width = command
+            if width <= 0:
+                self.surface.fill(color, rect)
+                return
+            # The outline is filled as four strips, pygame.draw.rect draws
+            # stray pixels when the clip area is small.
+            x, y, w, h = rect
+            self.surface.fill(color, (x, y, w, width))
+            self.surface.fill(color, (x, y + h - width, w, width))
+            self.surface.fill(color, (x, y, width, h))
+            self.surface.fill(color, (x + w - width, y, width, h))
+
+    # Redraw the dirty regions of the frame. Returns the rects that need to be
+    # pushed to the display.
+    def end(self):
+        dirty = self.dirty_rects()
+        surface = self.surface
+        for region in dirty:
+            surface.set_clip(region)
+            surface.fill(self.background, region)
+            for command in self.commands.values():
+                if region.colliderect(command[1]):
+                    self.execute(command)
+        surface.set_clip(None)
+        self.pixels = sum(rect.width * rect.height for rect in dirty)
+        if self.debug:
+            # Outline the dirty regions. The outlines are inside the regions,
+            # so they get erased by redrawing the same regions next frame.
+            for region in dirty:
+                pg.draw.rect(surface, (255, 0, 255), region, 1)
+            self.damage.extend(dirty)
+        return dirty
+
+
+# Clip the rects to bounds, drop empty ones and merge the overlapping ones.
+def merge_rects(rects, bounds):
+    merged = []
+    for rect in rects:
+        rect = rect.clip(bounds)
+        if not rect.width or not rect.height:
+            continue
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
@@ -0,0 +1,64 @@
+import pygame as pg
+
+
+# Scrolls a list of rows through a window of the given height, wrapping
+# around after the last row. The rows are fetched with page(start, count) and
+# turned into surfaces with render(row), but only those in the window and
+# margin rows after it, which are about to scroll in, are rendered and kept.
+# So the cost stays the same however many rows there are.
+class Scroller:
+    def __init__(self, height, row_height, page, render, margin=1):
+        self.height = height
+        self.row_height = row_height
+        self.page = page
+        self.render = render
+        self.margin = margin
+        self.count = 0
+        self.top = 0.0
+        self.rows = {}
+
+    # Start over from the top with count rows. The rows rendered so far are
+    # dropped, as they may have moved.
+    def reset(self, count):
+        self.count = count
+        self.top = 0.0
+        self.rows.clear()
+
+    def scroll(self, pixels):
+        if self.count:
+            self.top = (self.top + pixels) % (self.count * self.row_height)
+
+    def row(self, index):
+        image = self.rows.get(index)
+        if image is None:
+            image = self.rows[index] = self.render(self.page(index, 1)[0])
+        return image
+
+    # The visible rows as (surface, y in the window, area of the surface to
+    # show or None for all of it)
+    def visible(self):
+        if not self.count:
+            return []
+        top = int(self.top)
+        first = top // self.row_height
+        y = first * self.row_height - top
+        visible = []
+        index = first
+        while y < self.height:
+            image = self.row(index % self.count)
+            height = image.get_height()
+            clip_top = max(-y, 0)
+            clip_bottom = min(height, self.height - y)
+            if clip_top == 0 and clip_bottom == height:
+                visible.append((image, y, None))
+            elif clip_top < clip_bottom:
+                visible.append((image, y + clip_top, pg.Rect(0, clip_top, image.get_width(), clip_bottom - clip_top)))
+            y += self.row_height
+            index += 1
+        keep = {i % self.count for i in range(first, index + self.margin)}
+        for i in keep:
+            self.row(i)
+        for i in list(self.rows):
+            if i not in keep:
+                del self.rows[i]
+        return visible
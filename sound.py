@@ -0,0 +1,157 @@
+import pygame as pg
+
+from assets import init_mixer
+
+
+# A group of sounds with mixer channels of its own, so that a burst of one
+# kind of sound can't take the channels of another
+class Category:
+    def __init__(self, name, channels):
+        self.name = name
+        self.size = channels
+        self.voices = []
+
+
+# The sound playing on a channel. order tells which of two voices of the
+# same priority started first.
+class Voice:
+    def __init__(self, channel):
+        self.channel = channel
+        self.sound = None
+        self.priority = 0
+        self.order = 0
+        self.volume = None
+
+
+# A named sound, the asset it plays, its category and priority, and how many
+# times it may start in one frame
+class SoundEffect:
+    def __init__(self, name, asset, category, priority, max_per_frame):
+        self.name = name
+        self.asset = asset
+        self.category = category
+        self.priority = priority
+        self.max_per_frame = max_per_frame
+        self.frame_plays = 0
+
+
+# Plays sounds on the mixer channels reserved for their category. A sound
+# that starts more than max_per_frame times in a frame is only played that
+# many times, since the rest would be heard as the same sound anyway. When all
+# channels of a category are playing, the voice with the lowest priority,
+# and of those the oldest, is stopped for the new sound, unless the new sound
+# has a lower priority still, in which case it isn't played. Channel volumes
+# are only sent to the mixer when they change.
+#
+# get loads the sound of an asset by name. The channels are set up when the
+# first sound is played, as that is when the mixer is initialized.
+class SoundManager:
+    def __init__(self, get):
+        self.get = get
+        self.categories = {}
+        self.sounds = {}
+        self.ready = False
+        self.order = 0
+        self.counts = dict(plays=0, capped=0, stolen=0, dropped=0, volume_changes=0)
+
+    def category(self, name, channels):
+        self.categories[name] = Category(name, channels)
+
+    def sound(self, name, asset, category, priority=0, max_per_frame=1):
+        self.sounds[name] = SoundEffect(name, asset, self.categories[category], priority, max_per_frame)
+
+    def setup(self):
+        init_mixer()
+        total = sum(category.size for category in self.categories.values())
+        if pg.mixer.get_num_channels() < total:
+            pg.mixer.set_num_channels(total)
+        # Sound.play will not pick the reserved channels
+        pg.mixer.set_reserved(total)
+        index = 0
+        for category in self.categories.values():
+            category.voices = [Voice(pg.mixer.Channel(i)) for i in range(index, index + category.size)]
+            index += category.size
+        self.ready = True
+
+    # Call at the start of every frame
+    def begin_frame(self):
+        for sound in self.sounds.values():
+            sound.frame_plays = 0
+
+    # Find a channel for the sound: a free one, or the one playing the voice
+    # with the lowest priority if that is not above the sound's
+    def voice(self, sound):
+        victim = None
+        for voice in sound.category.voices:
+            if not voice.channel.get_busy():
+                return voice
+            if victim is None or (voice.priority, voice.order) < (victim.priority, victim.order):
+                victim = voice
+        if victim is not None and victim.priority <= sound.priority:
+            self.counts["stolen"] += 1
+            return victim
+        return None
+
+    # Start playing the sound. Returns whether it was played.
+    def play(self, name, loops=0, volume=1.0):
+        sound = self.sounds[name]
+        if sound.frame_plays >= sound.max_per_frame:
+            self.counts["capped"] += 1
+            return False
+        if not self.ready:
+            self.setup()
+        voice = self.voice(sound)
+        if voice is None:
+            self.counts["dropped"] += 1
+            return False
+        sound.frame_plays += 1
+        self.order += 1
+        voice.sound = sound
+        voice.priority = sound.priority
+        voice.order = self.order
+        voice.channel.play(self.get(sound.asset), loops=loops)
+        self.set_voice_volume(voice, volume)
+        self.counts["plays"] += 1
+        return True
+
+    # The voices playing the sound
+    def playing(self, name):
+        sound = self.sounds[name]
+        return [voice for voice in sound.category.voices if voice.sound is sound and voice.channel.get_busy()]
+
+    # Play the sound in a loop at the volume, or if it is playing already
+    # only set its volume
+    def loop(self, name, volume=1.0):
+        voices = self.playing(name)
+        if not voices:
+            self.play(name, loops=-1, volume=volume)
+        for voice in voices:
+            self.set_voice_volume(voice, volume)
+
+    def set_volume(self, name, volume):
+        for voice in self.playing(name):
+            self.set_voice_volume(voice, volume)
+
+    def set_voice_volume(self, voice, volume):
+        # The mixer has 128 volume steps
+        volume = min(max(int(volume * 128), 0), 128)
+        if volume != voice.volume:
+            voice.volume = volume
+            voice.channel.set_volume(volume / 128)
+            self.counts["volume_changes"] += 1
+
+    def stop(self, name):
+        if self.ready:
+            for voice in self.playing(name):
+                voice.channel.stop()
+                voice.sound = None
+
+    # The number of sounds played, skipped for the per-frame cap, that stopped
+    # another voice and that were not played for lack of a channel, and of
+    # channel volume changes sent to the mixer
+    def stats(self):
+        return dict(self.counts)
+
+    def resetstats(self):
+        for key in self.counts:
+            self.counts[key] = 0
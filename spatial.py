@@ -0,0 +1,102 @@
+from math import sqrt
+
+
+# Occupancy grid for placing points at least `spacing` apart. The cell size is
+# chosen so that a cell can hold at most one accepted point, which means that
+# checking whether a point is free only needs to look at the 5x5 block of cells
+# around it, no matter how many points there are.
+class OccupancyGrid:
+    def __init__(self, rect, spacing):
+        self.rect = rect
+        self.spacing = spacing
+        self.cell_size = spacing / sqrt(2)
+        self.columns = int(rect.width // self.cell_size) + 1
+        self.rows = int(rect.height // self.cell_size) + 1
+        self.reach = int(spacing // self.cell_size) + 1
+        self.cells = [[None] * self.columns for _ in range(self.rows)]
+
+    def cell(self, x, y):
+        return (
+            int((y - self.rect.top) // self.cell_size),
+            int((x - self.rect.left) // self.cell_size),
+        )
+
+    def is_free(self, x, y):
+        row, column = self.cell(x, y)
+        reach = self.reach
+        limit = self.spacing * self.spacing
+        for cells in self.cells[max(row - reach, 0):row + reach + 1]:
+            for point in cells[max(column - reach, 0):column + reach + 1]:
+                if point is not None:
+                    dx = point[0] - x
+                    dy = point[1] - y
+                    if dx * dx + dy * dy < limit:
+                        return False
+        return True
+
+    def add(self, x, y):
+        row, column = self.cell(x, y)
+        self.cells[row][column] = (x, y)
+
+    def remove(self, x, y):
+        row, column = self.cell(x, y)
+        if self.cells[row][column] == (x, y):
+            self.cells[row][column] = None
+
+    def clear(self):
+        for cells in self.cells:
+            cells[:] = [None] * self.columns
+
+
+# Pick a random free point from the grid that is not closer than clearance to
+# avoid_pos. Gives up after the given number of attempts and returns None, so
+# the work done per call is bounded even when the grid is full.
+def find_free_position(rng, grid, avoid_pos, clearance, attempts):
+    rect = grid.rect
+    ax, ay = avoid_pos
+    limit = clearance * clearance
+    for _ in range(attempts):
+        x = rng.randint(rect.left, rect.right - 1)
+        y = rng.randint(rect.top, rect.bottom - 1)
+        dx = x - ax
+        dy = y - ay
+        if dx * dx + dy * dy < limit:
+            continue
+        if grid.is_free(x, y):
+            return x, y
+    return None
+
+
+# Uniform grid broadphase. Entities are bucketed by the cell their center is
+# in, entities outside of rect go to the nearest edge cell. A query only visits
+# the cells overlapping the query rect grown by `margin`, which has to be at
+# least the largest half extent of the entities.
+class UniformGrid:
+    def __init__(self, rect, cell_size):
+        self.rect = rect
+        self.cell_size = cell_size
+        self.columns = int(rect.width // cell_size) + 1
+        self.rows = int(rect.height // cell_size) + 1
+        self.cells = [set() for _ in range(self.columns * self.rows)]
+
+    def column(self, x):
+        return min(max(int((x - self.rect.left) // self.cell_size), 0), self.columns - 1)
+
+    def row(self, y):
+        return min(max(int((y - self.rect.top) // self.cell_size), 0), self.rows - 1)
+
+    def insert(self, entity, x, y):
+        self.cells[self.row(y) * self.columns + self.column(x)].add(entity)
+
+    def remove(self, entity, x, y):
+        self.cells[self.row(y) * self.columns + self.column(x)].discard(entity)
+
+    def query(self, rect, margin=0):
+        left, right = self.column(rect.left - margin), self.column(rect.right + margin)
+        top, bottom = self.row(rect.top - margin), self.row(rect.bottom + margin)
+        found = []
+        for row in range(top, bottom + 1):
+            start = row * self.columns
+            for cell in self.cells[start + left:start + right + 1]:
+                found.extend(cell)
+        return found
@@ -0,0 +1,71 @@
+import pygame as pg
+
+from constants import SPRITE_ANGLE_STEP, SPRITE_SCALE_STEPS, SPRITE_CACHE_MB
+
+
+# Make the pixels of the colorkey of the image transparent and remove the
+# colorkey. Blitting per-pixel alpha together with a colorkey is several times
+# slower than plain alpha, and this way looks the same.
+def colorkey_to_alpha(image):
+    colorkey = image.get_colorkey()
+    if colorkey is None:
+        return image
+    mask = pg.mask.from_threshold(image, colorkey, (1, 1, 1, 1))
+    image.set_colorkey(None)
+    mask.to_surface(image, setcolor=(0, 0, 0, 0), unsetcolor=None)
+    return image
+
+
+# Cache of rotated and scaled copies of a single image. Angles and scales are
+# snapped to a grid so that all bubbles share the same small set of frames
+# instead of calling rotozoom for every bubble on every frame.
+class RotozoomCache:
+    def __init__(self, image, angle_step=SPRITE_ANGLE_STEP, scale_steps=SPRITE_SCALE_STEPS,
+                 memory_limit_mb=SPRITE_CACHE_MB):
+        self.image = image
+        self.angle_step = angle_step
+        self.scale_steps = scale_steps
+        self.angle_count = int(round(360 / angle_step))
+        self.memory_limit = memory_limit_mb * (1 << 20)
+        self.memory_used = 0
+        self.frames = {}
+
+    def frame_key(self, angle, scale):
+        angle_index = int(round(angle / self.angle_step)) % self.angle_count
+        scale_index = int(round(scale * self.scale_steps))
+        return angle_index, scale_index
+
+    def render(self, key):
+        angle_index, scale_index = key
+        frame = pg.transform.rotozoom(
+            self.image, angle_index * self.angle_step, scale_index / self.scale_steps
+        )
+        return colorkey_to_alpha(frame)
+
+    def get(self, angle, scale):
+        return self.frame(self.frame_key(angle, scale))
+
+    def frame(self, key):
+        frame = self.frames.get(key)
+        if frame is None:
+            frame = self.render(key)
+            size = frame.get_pitch() * frame.get_height()
+            # Once the memory limit is reached frames are rendered on demand
+            # like they would be without the cache.
+            if self.memory_used + size <= self.memory_limit:
+                self.frames[key] = frame
+                self.memory_used += size
+        return frame
+
+    def prerender(self):
+        for scale_index in range(self.scale_steps, -1, -1):
+            for angle_index in range(self.angle_count):
+                key = angle_index, scale_index
+                if key in self.frames:
+                    continue
+                frame = self.render(key)
+                size = frame.get_pitch() * frame.get_height()
+                if self.memory_used + size > self.memory_limit:
+                    return
+                self.frames[key] = frame
+                self.memory_used += size
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The game loads its assets relative to the working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+
+@pytest.fixture(autouse=True)
+def root_dir(monkeypatch):
+    monkeypatch.chdir(ROOT)
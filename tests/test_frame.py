@@ -0,0 +1,102 @@
+import random
+
+import pygame as pg
+import pytest
+
+import ah
+from constants import SIM_STEP
+from highscores import HighScores
+
+
+@pytest.fixture
+def game():
+    return ah.Game(ah.init(headless=True), rng=random.Random(0), music=False, persist=False)
+
+
+def click():
+    return pg.event.Event(pg.MOUSEBUTTONDOWN, pos=(320, 240), button=1)
+
+
+# The frame that changes state isn't drawn, so the next one draws the new
+# state before its first update when it is shorter than a step
+@pytest.mark.parametrize("delta_time", [4, 7, 8])
+def test_draw_before_first_update(game, delta_time):
+    game.frame([click()], SIM_STEP)
+    assert game.state == ah.GAME_COUNTDOWN
+    game.frame([], delta_time)
+
+    game.context.count = 0
+    game.frame([], SIM_STEP)
+    assert game.state == ah.GAME
+    game.frame([], delta_time)
+
+    game.context.time_remaining = 0
+    game.frame([], SIM_STEP)
+    assert game.state == ah.GAME_OVER
+    game.frame([], delta_time)
+
+    game.context.is_high_score = False
+    game.context.count = 0
+    game.frame([], SIM_STEP)
+    assert game.state == ah.TITLE_SCREEN
+    game.frame([], delta_time)
+
+
+@pytest.mark.parametrize("size", [3, 1000])
+def test_gameover_scrolls_best_scores(game, size):
+    game.high_scores = HighScores([(size - i, f"P{i}") for i in range(size)])
+    game.highscore_scroller.page = game.high_scores.page
+    context = ah.Context()
+    game.gameover_highscores(context)
+    shown = min(size, ah.HIGH_SCORES_SHOWN)
+    assert game.highscore_scroller.count == shown
+    widths = [game.render_highscore(entry).get_width() for entry in game.high_scores.top(shown)]
+    assert game.out_fader.get_width() == game.in_fader.get_width() == max(widths)
+    assert game.out_fader_rect.left == context.highscore_x
+
+
+def play_round(game):
+    game.frame([click()], SIM_STEP)
+    game.context.count = 0
+    game.frame([], SIM_STEP)
+    game.context.time_remaining = 0
+    game.frame([], SIM_STEP)
+    game.context.is_high_score = False
+    game.context.count = 0
+    game.frame([], SIM_STEP)
+    assert game.state == ah.TITLE_SCREEN
+
+
+# The sprite frames rendered in one round are still there in the next
+def test_game_assets_kept_between_rounds(game):
+    play_round(game)
+    frames = ah.ASSETS.get("bubble_frames")
+    play_round(game)
+    assert ah.ASSETS.get("bubble_frames") is frames
+    stats = ah.ASSETS.stats()
+    assert all(stats[name]["loads"] == 1 for name in ah.GAME_ASSETS)
+    assert not stats["end_sound"]["loaded"]
+
+
+# With --profile the whole run is traced, whatever the overlay shows
+def test_profile_overlay_keeps_whole_run_trace(tmp_path):
+    game = ah.Game(ah.init(headless=True), rng=random.Random(0), music=False, persist=False,
+                   profile=str(tmp_path / "trace.json"))
+    for _ in range(10):
+        game.frame([], SIM_STEP)
+    game.toggle_profile()
+    game.frame([], SIM_STEP)
+    game.toggle_profile()
+    game.frame([], SIM_STEP)
+    assert game.profiler.enabled
+    assert len(game.profiler.trace) == 12
+
+
+def test_profile_toggled_without_whole_run_profile(game):
+    game.toggle_profile()
+    game.frame([], SIM_STEP)
+    assert len(game.profiler.trace) == 1
+    game.toggle_profile()
+    game.frame([], SIM_STEP)
+    assert not game.profiler.enabled
+    assert len(game.profiler.trace) == 0
@@ -0,0 +1,46 @@
+import json
+
+from highscores import HighScores
+
+DEFAULT = [(30, "JANU"), (20, "JANU"), (10, "JANU")]
+
+
+def load(path, old_path=None):
+    high_scores = HighScores(DEFAULT, str(path), old_path=old_path and str(old_path))
+    high_scores.load()
+    high_scores.wait_loaded()
+    return high_scores
+
+
+def test_insert_saved_and_read_back(tmp_path):
+    path = tmp_path / "highscore.json"
+    high_scores = load(path)
+    assert high_scores.insert(20, "NEW") == 2
+    high_scores.flush()
+    assert load(path).top(4) == [(30, "JANU"), (20, "JANU"), (20, "NEW"), (10, "JANU")]
+
+
+def test_broken_file_falls_back_to_backup(tmp_path):
+    path = tmp_path / "highscore.json"
+    high_scores = load(path)
+    high_scores.insert(40, "FIRST")
+    high_scores.flush()
+    high_scores.insert(50, "SECOND")
+    high_scores.flush()
+    path.write_text("[\n[60, \"CUT")
+    assert load(path).top(2) == [(40, "FIRST"), (30, "JANU")]
+
+
+# Older versions saved the table with json.dumps(scores, indent=4)
+def test_old_file_migrated_once(tmp_path):
+    path = tmp_path / "new" / "highscore.json"
+    old_path = tmp_path / "old" / "highscore.json"
+    old_path.parent.mkdir()
+    old_path.write_text(json.dumps([[100, "OLD"], [5, "OLDER"]], indent=4))
+    high_scores = load(path, old_path)
+    assert high_scores.top(3) == [(100, "OLD"), (5, "OLDER")]
+    high_scores.flush()
+    assert path.exists()
+
+    old_path.write_text(json.dumps([[999, "IGNORED"]], indent=4))
+    assert load(path, old_path).top(1) == [(100, "OLD")]
@@ -0,0 +1,108 @@
+import math
+
+import numpy
+import pygame as pg
+import pytest
+
+import ptext
+
+
+@pytest.fixture(scope="module", autouse=True)
+def display():
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    pg.font.init()
+    yield
+    pg.display.quit()
+
+
+def render(text, fontsize, opx):
+    surf = ptext.getsurf(text, fontsize=fontsize, owidth=opx / fontsize / ptext.OUTLINE_UNIT, color="white",
+                         ocolor="black", cache=False)
+    alpha = pg.surfarray.array_alpha(surf).astype(int)
+    return surf.get_size(), alpha
+
+
+# The octagon of the dilation misses a few pixels at the corners of the disc
+# drawn by the per-point blits, and antialiased edges take the maximum alpha
+# instead of the composite. Apart from those the outlines are the same.
+@pytest.mark.parametrize("opx", [6, 8, 12, 16])
+@pytest.mark.parametrize("fontsize", [24, 48])
+@pytest.mark.parametrize("text", ["GAME OVER", "Score: 01234", "ÄH!"])
+def test_dilated_outline_matches_blits(monkeypatch, text, fontsize, opx):
+    monkeypatch.setattr(ptext, "OUTLINE_DILATE_MIN_PX", opx + 1)
+    size, blitted = render(text, fontsize, opx)
+    monkeypatch.setattr(ptext, "OUTLINE_DILATE_MIN_PX", opx)
+    dilated_size, dilated = render(text, fontsize, opx)
+    assert dilated_size == size
+    difference = abs(blitted - dilated)
+    assert (difference > 128).mean() < 0.03
+    assert difference.mean() < 10
+
+
+# The effects as they were composed before the single pass, one cached stage
+# on top of the other: the shadow is the text outlined in ocolor and filled
+# with scolor, and the outline is covered by the text on its background
+def reference_effects(text, fontsize, color, background, owidth, ocolor, shadow, scolor):
+    opx = math.ceil(owidth * fontsize * ptext.OUTLINE_UNIT)
+    sx, sy = (math.ceil(s * fontsize * ptext.SHADOW_UNIT) for s in shadow or (0, 0))
+
+    def outlined(color, background):
+        plain = ptext.getsurf(text, fontsize=fontsize, color=color, background=background, cache=False)
+        osurf = ptext.getsurf(text, fontsize=fontsize, color=ocolor, background=(0, 0, 0, 0), cache=False)
+        w0, h0 = plain.get_size()
+        surf = pg.Surface((w0 + 2 * opx, h0 + 2 * opx)).convert_alpha()
+        surf.fill(background)
+        for dx, dy in ptext._circlepoints(opx):
+            surf.blit(osurf, (dx + opx, dy + opx))
+        surf.blit(plain, (opx, opx))
+        return surf
+
+    if shadow is None:
+        return outlined(color, background)
+    main = outlined(color, (0, 0, 0, 0))
+    shadow_surf = outlined(scolor, (0, 0, 0, 0))
+    w, h = main.get_size()
+    surf = pg.Surface((w + abs(sx), h + abs(sy))).convert_alpha()
+    surf.fill(background)
+    dx, dy = max(sx, 0), max(sy, 0)
+    surf.blit(shadow_surf, (dx, dy))
+    surf.blit(main, (abs(sx) - dx, abs(sy) - dy))
+    return surf
+
+
+def pixels(surf):
+    rgba = numpy.dstack([pg.surfarray.array3d(surf), pg.surfarray.array_alpha(surf)]).astype(int)
+    # The color of transparent pixels doesn't show
+    rgba[rgba[..., 3] == 0] = 0
+    return rgba
+
+
+@pytest.mark.parametrize("shadow", [None, (1, 1), (-2, 1.5)])
+@pytest.mark.parametrize("background", [(0, 0, 0, 0), (20, 40, 160), (20, 40, 160, 128)])
+def test_effects_match_stages(background, shadow):
+    options = dict(color=(255, 220, 0), owidth=2, ocolor=(200, 0, 0), scolor=(0, 160, 0))
+    surf = ptext.getsurf("ÄH! 123", fontsize=32, background=background, shadow=shadow, cache=False, **options)
+    reference = reference_effects("ÄH! 123", 32, background=background, shadow=shadow, **options)
+    assert surf.get_size() == reference.get_size()
+    assert abs(pixels(surf) - pixels(reference)).max() <= 2
+
+
+# Anchoring at the middle also centers the lines, which has to be part of the
+# key the text is prewarmed under
+@pytest.mark.parametrize("anchor", [dict(midtop=(320, 10)), dict(center=(320, 240)), dict(topleft=(5, 5))])
+def test_prewarmed_text_drawn_from_cache(anchor):
+    ptext._surf_cache.clear()
+    text = ptext.Text("GAME\nOVER", fontsize=40, color="orange", owidth=1, **anchor)
+    ptext.prewarm([text, ("CLICK TO\nBEGIN", dict(fontsize=30, **anchor))])
+    ptext.COLLECT_STATS = True
+    ptext.resetstats()
+    try:
+        text.draw()
+        ptext.draw("CLICK TO\nBEGIN", fontsize=30, **anchor)
+        stats = ptext.getstats()
+    finally:
+        ptext.COLLECT_STATS = False
+    assert stats["surf"]["hits"] == 2
+    assert stats["surf"]["misses"] == 0
+    assert stats["render_count"] == 0
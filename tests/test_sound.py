@@ -0,0 +1,71 @@
+import random
+
+import pygame as pg
+import pytest
+
+import ah
+from sound import SoundManager
+
+
+# A manager of its own with the game's sounds
+@pytest.fixture
+def sounds():
+    sounds = SoundManager(ah.ASSETS.get)
+    ah.configure_sounds(sounds)
+    yield sounds
+    pg.mixer.stop()
+    pg.mixer.set_reserved(0)
+
+
+def test_plays_capped_per_frame(sounds):
+    sounds.begin_frame()
+    assert [sounds.play("pick") for _ in range(5)] == [True, False, False, False, False]
+    assert sounds.stats()["capped"] == 4
+    sounds.begin_frame()
+    assert sounds.play("pick")
+    assert sounds.stats()["plays"] == 2
+
+
+def test_oldest_voice_stolen_when_category_full(sounds):
+    for _ in range(5):
+        sounds.begin_frame()
+        assert sounds.play("pick")
+    stats = sounds.stats()
+    assert stats["stolen"] == 1
+    assert stats["dropped"] == 0
+    assert len(sounds.playing("pick")) == 4
+
+
+# Bursts of up to 20 pick and bubble events a frame, the end jingle every two
+# seconds and a movement loop changing speed, as in the sound benchmark
+def test_burst_within_caps_and_nothing_dropped(sounds):
+    rng = random.Random(0)
+    for frame in range(600):
+        sounds.begin_frame()
+        for _ in range(rng.randint(0, 20)):
+            sounds.play(rng.choice(("pick", "bubble")))
+        if frame % 120 == 0:
+            sounds.play("end")
+        sounds.loop("player", 0.5 if frame % 60 < 30 else (60 - frame % 60) / 30)
+        for sound in sounds.sounds.values():
+            assert sound.frame_plays <= sound.max_per_frame
+        for category in sounds.categories.values():
+            assert sum(voice.channel.get_busy() for voice in category.voices) <= category.size
+    stats = sounds.stats()
+    assert stats["dropped"] == 0
+    assert stats["capped"] > 0
+    assert stats["volume_changes"] < 600
+    assert len(sounds.playing("player")) == 1
+
+
+def test_loop_only_sends_volume_changes(sounds):
+    sounds.begin_frame()
+    sounds.loop("player", 0.5)
+    for _ in range(10):
+        sounds.begin_frame()
+        sounds.loop("player", 0.5)
+    assert sounds.stats()["volume_changes"] == 1
+    sounds.loop("player", 0.25)
+    assert sounds.stats()["volume_changes"] == 2
+    sounds.stop("player")
+    assert sounds.playing("player") == []